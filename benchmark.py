@@ -0,0 +1,276 @@
+# benchmark.py - headless benchmark suite for touchGUI (rendering, page switching, touch latency)
+# runs on SDL's dummy video driver and prints the results as JSON, e.g.
+#   python benchmark.py --output bench-1.2.json
+
+# Imports
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+# keep pygame's import banner off stdout, which carries the report
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+# headless, no sound output (SDL may fall back to dumping audio to a file in the working directory)
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+import pygame
+import touchGUI
+import textrect
+try:
+	import fbdisplay
+except ImportError:
+	# framebuffer backend needs numpy
+	fbdisplay = None
+
+# sample texts
+TEXT_SINGLE = "Frequency"
+TEXT_WRAPPED = "Tuner frequency out of range, please enter a value within the limits"
+TEXT_WORDS = "level frequency tuner squelch carrier offset band channel antenna power"
+
+
+# Timing helpers
+
+# time func over a number of iterations, returns statistics in milliseconds
+def measure(func, iterations, warmup = 3):
+	for i in range(warmup):
+		func()
+	samples = []
+	for i in range(iterations):
+		start = time.time()
+		func()
+		samples.append((time.time() - start) * 1000.0)
+	return statistics(samples)
+
+# summarize a list of samples (milliseconds)
+def statistics(samples):
+	samples = sorted(samples)
+	count = len(samples)
+	if count == 0:
+		return {'iterations': 0}
+	return {
+		'iterations': count,
+		'min_ms': samples[0],
+		'median_ms': samples[count // 2],
+		'p90_ms': samples[min(count - 1, int(count * 0.9))],
+		'mean_ms': sum(samples) / count,
+		'max_ms': samples[-1]}
+
+
+# Test setup
+
+# use the benchmark font for all elements
+def fontSetup(options):
+	for elementClass in (touchGUI.GUIButton, touchGUI.GUITextBox):
+		elementClass.FONT_REGULAR_PATH = options.font
+
+# NumPadPage with font sizes scaled to the benchmark font
+class BenchNumPadPage(touchGUI.NumPadPage):
+
+	FontScale = 1.0
+
+	def Initialize(self):
+		touchGUI.NumPadPage.Initialize(self)
+		for element in self.Elements:
+			if hasattr(element, 'FontSize'):
+				element.FontSize = int(element.FontSize * self.FontScale)
+
+# create a page attached to an offscreen surface in the display's pixel format for element benchmarks
+def offscreenPage(size):
+	page = touchGUI.GUIPage('bench')
+	page.RenderingSurfaceSet(pygame.Surface(size, 0, pygame.display.get_surface()))
+	return page
+
+
+# Benchmarks
+
+# element Render with warm caches and with appearance changing on every call
+def benchElements(options, results):
+	page = offscreenPage((800, 480))
+	for name, text in (('single', TEXT_SINGLE), ('wrapped', TEXT_WRAPPED.replace(' please', '\nplease'))):
+		button = page.AddElement(touchGUI.GUIButton('btn_' + name, 0, 0, 400, 160, text, None))
+		button.FontSize = int(24 * options.font_scale)
+		results['button_render_' + name] = measure(button.Render, options.iterations)
+		texts = [text + ' ' + str(i) for i in range(2)]
+		def buttonChange():
+			button.Text = texts[0]
+			texts.reverse()
+			button.Render()
+		results['button_render_' + name + '_changing'] = measure(buttonChange, options.iterations)
+
+	for name, text in (('single', TEXT_SINGLE), ('wrapped', TEXT_WRAPPED)):
+		textbox = page.AddElement(touchGUI.GUITextBox('txt_' + name, 0, 200, 400, 160, text, None))
+		textbox.FontSize = int(24 * options.font_scale)
+		results['textbox_render_' + name] = measure(textbox.Render, options.iterations)
+		counter = [0]
+		def textboxChange():
+			counter[0] = counter[0] + 1
+			textbox.Text = text + ' ' + str(counter[0])
+			textbox.Render()
+		results['textbox_render_' + name + '_changing'] = measure(textboxChange, options.iterations)
+
+	# numeric readout, rasterized as a whole and composed from the glyph atlas
+	for name, glyphAtlas in (('readout', False), ('readout_atlas', True)):
+		readout = page.AddElement(touchGUI.GUITextBox('txt_' + name, 400, 0, 197, 117, '', None))
+		readout.FontSize = int(60 * options.font_scale)
+		readout.TextAlignHorizontal = touchGUI.GUITextBox.TEXTALIGN_HORIZONTAL_RIGHT
+		readout.GlyphAtlas = glyphAtlas
+		counter = [0]
+		def readoutChange():
+			counter[0] = (counter[0] + 1) % 10000
+			readout.Text = '%04d' % counter[0]
+			readout.Render()
+		results['textbox_render_' + name + '_changing'] = measure(readoutChange, options.iterations)
+
+# render_textrect with varying text lengths, uncached and cached
+def benchTextrect(options, results):
+	font = (options.font, int(20 * options.font_scale))
+	for length in (16, 128, 1024):
+		text = (TEXT_WORDS + ' ') * (length // len(TEXT_WORDS) + 1)
+		text = text[:length]
+		rect = pygame.Rect(0, 0, 480, 4000)
+		results['render_textrect_%d_uncached' % length] = measure(lambda: textrect.render_textrect_uncached(text, font, rect, (0, 255, 0), (0, 0, 0)), options.iterations)
+		results['render_textrect_%d_cached' % length] = measure(lambda: textrect.render_textrect(text, font, rect, (0, 255, 0), (0, 0, 0)), options.iterations)
+
+# GUI.Show between two pages
+def benchShow(gui, options, results):
+	pageA = gui.AddPage(BenchNumPadPage('benchShowA', 'Page A', 'MHz', 4, 10, 5000, None, None))
+	pageB = gui.AddPage(BenchNumPadPage('benchShowB', 'Page B', 'MHz', 4, 10, 5000, None, None))
+	pages = [pageA, pageB]
+	def show():
+		gui.Show(pages[0])
+		pages.reverse()
+	results['gui_show'] = measure(show, options.iterations)
+	for page in pages:
+		page.RetainBackbuffer = False
+	results['gui_show_no_backbuffer'] = measure(show, options.iterations)
+
+# NumPadPage keypress-to-pixel latency: synthetic MOUSEBUTTONDOWN until the display update showing the digit
+def benchKeypress(gui, options, results, resultName):
+	page = gui.AddPage(BenchNumPadPage('benchKeypress', 'Keypress', 'MHz', 4, 0, 9999, None, None))
+	gui.Show(page)
+
+	# record display updates
+	presented = threading.Event()
+	displayUpdate = pygame.display.update
+	def displayUpdateHook(*args):
+		displayUpdate(*args)
+		if page.userInput != '':
+			presented.set()
+	pygame.display.update = displayUpdateHook
+
+	samples = []
+	button = page.btnNum5
+	position = (button.PosX + button.SizeX // 2, button.PosY + button.SizeY // 2)
+	try:
+		for i in range(options.iterations):
+			# reset input on the GUI thread and let the loop settle
+			cleared = threading.Event()
+			gui.Post(page.btnClear_Click)
+			gui.Post(cleared.set)
+			gui.Wake()
+			cleared.wait(2.0)
+			time.sleep(options.settle)
+			presented.clear()
+			start = time.time()
+			pygame.mouse.set_pos(position)
+			pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=position, button=1))
+			if presented.wait(2.0):
+				samples.append((time.time() - start) * 1000.0)
+			pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=position, button=1))
+	finally:
+		pygame.display.update = displayUpdate
+	results[resultName] = statistics(samples)
+
+
+# display backend present cost, full screen and a button sized region
+def benchPresent(gui, options, results, resultName):
+	gui.Surface.fill((0, 255, 0))
+	results[resultName + '_full'] = measure(lambda: gui.Display.Update([gui.Surface.get_rect()]), options.iterations)
+	results[resultName + '_button'] = measure(lambda: gui.Display.Update([pygame.Rect(200, 210, 200, 90)]), options.iterations)
+
+
+# run the whole suite, returns report dict
+def run(options):
+	fontSetup(options)
+	BenchNumPadPage.FontScale = options.font_scale
+	results = {}
+
+	# element and page benchmarks on a GUI in poll mode
+	# (the dummy driver's native depth is 8 bits palettized, unlike the panels, so the depth is set explicitly)
+	gui = touchGUI.GUI(touchGUI.GUI.LOOPMODE_POLL, videoDriver='dummy', framebufferDevice=None, displayDepth=options.depth)
+	try:
+		benchElements(options, results)
+		benchTextrect(options, results)
+		benchShow(gui, options, results)
+		benchKeypress(gui, options, results, 'numpad_keypress_latency_poll')
+		benchPresent(gui, options, results, 'present_sdl')
+	finally:
+		gui.Shutdown()
+		gui.GuiThread.join()
+
+	# keypress latency in event mode
+	gui = touchGUI.GUI(touchGUI.GUI.LOOPMODE_EVENT, videoDriver='dummy', framebufferDevice=None, displayDepth=options.depth)
+	try:
+		benchKeypress(gui, options, results, 'numpad_keypress_latency_event')
+	finally:
+		gui.Shutdown()
+		gui.GuiThread.join()
+
+	# framebuffer backend on a file backed RGB565 framebuffer
+	if fbdisplay != None:
+		fbFile = tempfile.NamedTemporaryFile(prefix = 'touchGUI-fb-')
+		fbFile.truncate(800 * 480 * 2)
+		gui = touchGUI.GUI(touchGUI.GUI.LOOPMODE_EVENT, videoDriver='dummy', framebufferDevice=None, display=fbdisplay.FramebufferDisplay(fbFile.name, (800, 480), fbdisplay.PIXELFORMAT_RGB565))
+		try:
+			benchPresent(gui, options, results, 'present_framebuffer_rgb565')
+		finally:
+			gui.Shutdown()
+			gui.GuiThread.join()
+			fbFile.close()
+
+	return {
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(),
+		'pygame': pygame.version.ver,
+		'machine': platform.machine(),
+		'font': options.font,
+		'font_scale': options.font_scale,
+		'depth': options.depth,
+		'results': results}
+
+# command line entry point
+def main(argv):
+	# default to the GUI font, fall back to the font shipped with pygame (needs smaller sizes to fit)
+	defaultFont = touchGUI.GUIButton.FONT_REGULAR_PATH
+	defaultScale = 1.0
+	if not os.path.exists(defaultFont):
+		defaultFont = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+		defaultScale = 0.75
+
+	parser = argparse.ArgumentParser(description='touchGUI headless benchmark suite')
+	parser.add_argument('--iterations', type=int, default=200, help='iterations per benchmark')
+	parser.add_argument('--settle', type=float, default=0.06, help='seconds to wait between keypresses')
+	parser.add_argument('--font', default=defaultFont, help='font file for all elements')
+	parser.add_argument('--font-scale', type=float, default=defaultScale, help='scale factor for font sizes')
+	parser.add_argument('--depth', type=int, default=16, choices=(16, 32), help='display depth in bits per pixel')
+	parser.add_argument('--output', default=None, help='write JSON report to file instead of stdout')
+	options = parser.parse_args(argv)
+
+	# keep GUI diagnostics off stdout, which carries the report
+	stdout = sys.stdout
+	sys.stdout = sys.stderr
+	try:
+		report = run(options)
+	finally:
+		sys.stdout = stdout
+	output = json.dumps(report, indent=2, sort_keys=True)
+	if options.output != None:
+		with open(options.output, 'w') as outputFile:
+			outputFile.write(output + '\n')
+	else:
+		print (output)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,133 @@
+# fbdisplay.py - memory mapped framebuffer display backend for touchGUI (based on pygame and numpy)
+# the GUI renders offscreen, changed regions are converted to the framebuffer's pixel format and written in place
+#   gui = touchGUI.GUI(display = fbdisplay.FramebufferDisplay('/dev/fb1'))
+# any file with framebuffer layout works as well (give size and bits per pixel), e.g. for testing
+
+# Imports
+import os
+import mmap
+import numpy
+import pygame
+
+# supported framebuffer pixel formats (bits per pixel)
+PIXELFORMAT_RGB565 = 16		# 16 bit 5-6-5, little endian
+PIXELFORMAT_XRGB8888 = 32	# 32 bit, stored B, G, R, X
+
+# framebuffer exception class
+class FramebufferException(Exception):
+	def __init__(self, message = None):
+		Exception.__init__(self, message)
+		self.message = message
+	def __str__(self):
+		return self.message
+
+# Framebuffer display backend class, same interface as touchGUI.GUIDisplay
+class FramebufferDisplay:
+
+	# default framebuffer device
+	FRAMEBUFFER_DEVICE = '/dev/fb1'
+
+	# sysfs directory with framebuffer geometry (Linux)
+	SYSFS_GRAPHICS_PATH = '/sys/class/graphics'
+
+	# constructor, geometry not given is read from sysfs (lineLength defaults to tightly packed lines)
+	def __init__(self, devicePath = FRAMEBUFFER_DEVICE, size = None, bitsPerPixel = None, lineLength = None):
+		self.DevicePath = devicePath
+		self.Size = size
+		self.BitsPerPixel = bitsPerPixel
+		self.LineLength = lineLength
+		self.Surface = None
+		self.fbFile = None
+		self.fbMap = None
+		self.frame = None
+
+	# (internal use) read a framebuffer attribute from sysfs, None if not available
+	def sysfsRead(self, attribute):
+		path = os.path.join(self.SYSFS_GRAPHICS_PATH, os.path.basename(self.DevicePath), attribute)
+		try:
+			with open(path, 'r') as sysfsFile:
+				return sysfsFile.read().strip()
+		except IOError:
+			return None
+
+	# (internal use) complete framebuffer geometry from sysfs
+	def geometryGet(self):
+		if self.Size == None:
+			virtualSize = self.sysfsRead('virtual_size')
+			if virtualSize == None:
+				raise FramebufferException("Framebuffer size unknown for " + self.DevicePath)
+			self.Size = tuple(int(value) for value in virtualSize.split(','))
+		if self.BitsPerPixel == None:
+			bitsPerPixel = self.sysfsRead('bits_per_pixel')
+			if bitsPerPixel == None:
+				raise FramebufferException("Framebuffer pixel format unknown for " + self.DevicePath)
+			self.BitsPerPixel = int(bitsPerPixel)
+		if self.BitsPerPixel not in (PIXELFORMAT_RGB565, PIXELFORMAT_XRGB8888):
+			raise FramebufferException("Unsupported framebuffer pixel format: " + str(self.BitsPerPixel) + " bits per pixel")
+		if self.LineLength == None:
+			stride = self.sysfsRead('stride')
+			if stride != None:
+				self.LineLength = int(stride)
+			else:
+				self.LineLength = self.Size[0] * self.BitsPerPixel // 8
+
+	# open display, returns the surface to render to (size None: framebuffer size, depth 0: framebuffer depth)
+	def Open(self, size = None, depth = 0):
+		self.geometryGet()
+		if size == None:
+			size = self.Size
+		if size[0] > self.Size[0] or size[1] > self.Size[1]:
+			raise FramebufferException("Display size " + str(size) + " exceeds framebuffer size " + str(self.Size))
+
+		# pygame display mode is needed for input events only, it is never presented
+		# requested in the framebuffer's own depth, so SDL (fbcon on the same device) does not reprogram the
+		# pixel format underneath the mapping, and surfaces in display format match the rendering surface
+		pygame.display.set_mode(size, 0, self.BitsPerPixel)
+		if depth == 0:
+			depth = self.BitsPerPixel
+		self.Surface = pygame.Surface(size, 0, depth)
+
+		# map the framebuffer and view it as array of pixel rows
+		bytesPerPixel = self.BitsPerPixel // 8
+		self.fbFile = open(self.DevicePath, 'r+b')
+		self.fbMap = mmap.mmap(self.fbFile.fileno(), self.LineLength * self.Size[1])
+		if self.BitsPerPixel == PIXELFORMAT_RGB565:
+			pixelType = numpy.uint16
+		else:
+			pixelType = numpy.uint32
+		self.frame = numpy.ndarray((size[1], size[0]), pixelType, buffer = self.fbMap, strides = (self.LineLength, bytesPerPixel))
+		return self.Surface
+
+	# write changed regions to the framebuffer
+	def Update(self, rects):
+		bounds = self.Surface.get_rect()
+		for rect in rects:
+			rect = pygame.Rect(rect).clip(bounds)
+			if rect.width > 0 and rect.height > 0:
+				# copy region out (holds the GIL, so rendering threads never find the surface locked)
+				pixels = numpy.frombuffer(pygame.image.tostring(self.Surface.subsurface(rect), 'RGBX'), numpy.uint8).reshape(rect.height, rect.width, 4)
+				self.frame[rect.top:rect.bottom, rect.left:rect.right] = self.convert(pixels)
+
+	# (internal use) convert rows of R, G, B, X bytes to framebuffer pixels
+	def convert(self, pixels):
+		if self.BitsPerPixel == PIXELFORMAT_RGB565:
+			red = pixels[..., 0].astype(numpy.uint16)
+			green = pixels[..., 1].astype(numpy.uint16)
+			blue = pixels[..., 2].astype(numpy.uint16)
+			return ((red >> 3) << 11) | ((green >> 2) << 5) | (blue >> 3)
+		else:
+			red = pixels[..., 0].astype(numpy.uint32)
+			green = pixels[..., 1].astype(numpy.uint32)
+			blue = pixels[..., 2].astype(numpy.uint32)
+			return (red << 16) | (green << 8) | blue
+
+	# close display, unmapping the framebuffer
+	def Close(self):
+		self.frame = None
+		if self.fbMap != None:
+			self.fbMap.flush()
+			self.fbMap.close()
+			self.fbMap = None
+		if self.fbFile != None:
+			self.fbFile.close()
+			self.fbFile = None
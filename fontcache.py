@@ -0,0 +1,63 @@
+# fontcache.py - process-wide font registry for touchGUI (based on pygame)
+# loads every (path, size, style) combination once and shares the Font object
+
+# Imports
+import threading
+import collections
+import pygame
+
+# font style flags (may be combined)
+FONTSTYLE_NORMAL = 0
+FONTSTYLE_BOLD = 1
+FONTSTYLE_ITALIC = 2
+FONTSTYLE_UNDERLINE = 4
+
+# Font registry class, keeps loaded pygame Font objects in LRU order
+class FontCache:
+
+	# default maximum number of loaded fonts
+	MAXFONTS_DEFAULT = 32
+
+	# constructor
+	def __init__(self, maxFonts = MAXFONTS_DEFAULT):
+		self.MaxFonts = maxFonts
+		self.Hits = 0
+		self.Misses = 0
+		self.Evictions = 0
+		self.fonts = collections.OrderedDict()
+		self.lock = threading.Lock()
+
+	# get Font object for path, size and style, loading it on first use
+	# NOTE: returned fonts are shared, do not change their style flags
+	def Get(self, fontPath, fontSize, fontStyle = FONTSTYLE_NORMAL):
+		key = (fontPath, fontSize, fontStyle)
+		with self.lock:
+			font = self.fonts.pop(key, None)
+			if font != None:
+				self.Hits = self.Hits + 1
+			else:
+				self.Misses = self.Misses + 1
+				font = pygame.font.Font(fontPath, fontSize)
+				font.set_bold(bool(fontStyle & FONTSTYLE_BOLD))
+				font.set_italic(bool(fontStyle & FONTSTYLE_ITALIC))
+				font.set_underline(bool(fontStyle & FONTSTYLE_UNDERLINE))
+				# evict least recently used fonts
+				while len(self.fonts) >= max(self.MaxFonts, 1):
+					self.fonts.popitem(False)
+					self.Evictions = self.Evictions + 1
+			# (re)insert as most recently used
+			self.fonts[key] = font
+			return font
+
+	# drop all loaded fonts
+	def Clear(self):
+		with self.lock:
+			self.fonts.clear()
+
+	# get registry statistics
+	def Stats(self):
+		with self.lock:
+			return {'fonts': len(self.fonts), 'maxFonts': self.MaxFonts, 'hits': self.Hits, 'misses': self.Misses, 'evictions': self.Evictions}
+
+# shared registry used by touchGUI and textrect
+Fonts = FontCache()
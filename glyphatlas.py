@@ -0,0 +1,181 @@
+# glyphatlas.py - glyph atlas text renderer for touchGUI (based on pygame)
+# every glyph is rasterized once per (font, color) into a shared atlas surface, strings are then
+# composed by blitting glyphs at cached advances (plus kerning), which makes fast changing readouts cheap
+
+# Imports
+import threading
+import collections
+import pygame
+
+# Glyph atlas class, holds the glyphs of one font in one color
+class GlyphAtlas:
+
+	# atlas surface width, glyphs are packed into rows of font height
+	ATLAS_WIDTH = 512
+
+	# constructor
+	def __init__(self, font, color):
+		self.Font = font
+		self.Color = tuple(color)
+		self.Height = font.get_height()
+		self.Surface = None
+		self.glyphs = {}			# character -> (atlas area, offset x, advance)
+		self.kerning = {}			# (left character, right character) -> kerning adjustment
+		self.cursorX = 0
+		self.cursorY = 0
+		self.lock = threading.Lock()
+
+	# (internal use) get atlas entry of a character, rasterizing it on first use (lock held)
+	def glyphGet(self, char):
+		glyph = self.glyphs.get(char)
+		if glyph != None:
+			return glyph
+
+		# glyph metrics, rendered glyph images start at the left bearing if it is negative
+		metrics = self.Font.metrics(char)[0]
+		if metrics != None:
+			offsetX = min(0, metrics[0])
+			advance = metrics[4]
+		else:
+			offsetX = 0
+			advance = self.Font.size(char)[0]
+		image = self.Font.render(char, True, self.Color)
+
+		# pack image into the current row, start new row or grow atlas if needed
+		width = image.get_width()
+		if self.Surface == None:
+			self.atlasGrow(max(self.ATLAS_WIDTH, width), self.Height)
+		if self.cursorX + width > self.Surface.get_width():
+			self.cursorX = 0
+			self.cursorY = self.cursorY + self.Height
+		if self.cursorY + self.Height > self.Surface.get_height() or width > self.Surface.get_width():
+			self.atlasGrow(max(self.Surface.get_width(), width), max(self.Surface.get_height() * 2, self.cursorY + self.Height))
+		area = pygame.Rect(self.cursorX, self.cursorY, width, image.get_height())
+		# copy pixels including alpha, not blended
+		image.set_alpha(None)
+		self.Surface.blit(image, area)
+		self.cursorX = self.cursorX + width
+
+		glyph = self.glyphs[char] = (area, offsetX, advance)
+		return glyph
+
+	# (internal use) replace atlas surface by a larger one, keeping the packed glyphs (lock held)
+	def atlasGrow(self, width, height):
+		surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+		surface.fill((0, 0, 0, 0))
+		if self.Surface != None:
+			self.Surface.set_alpha(None)
+			surface.blit(self.Surface, (0, 0))
+		self.Surface = surface
+
+	# (internal use) get kerning adjustment between two characters (lock held)
+	# measured once per pair from the font, as pygame does not expose kerning directly
+	def kerningGet(self, left, right):
+		pair = (left, right)
+		kerning = self.kerning.get(pair)
+		if kerning == None:
+			leftGlyph = self.glyphGet(left)
+			rightGlyph = self.glyphGet(right)
+			kerning = self.Font.size(left + right)[0] - self.Font.size(right)[0] - leftGlyph[2] - rightGlyph[1] + leftGlyph[1]
+			self.kerning[pair] = kerning
+		return kerning
+
+	# (internal use) get glyph positions of a string, list of (atlas area, x) and total width (lock held)
+	def layout(self, text):
+		placed = []
+		penX = 0
+		left = None
+		minX = 0
+		maxX = 0
+		for char in text:
+			area, offsetX, advance = self.glyphGet(char)
+			if left != None:
+				penX = penX + self.kerningGet(left, char)
+			placed.append((area, penX + offsetX))
+			minX = min(minX, penX + offsetX)
+			maxX = max(maxX, penX + offsetX + area.width, penX + advance)
+			penX = penX + advance
+			left = char
+		# shift glyphs that overhang to the left into the string's box
+		if minX < 0:
+			placed = [(area, x - minX) for area, x in placed]
+		return placed, maxX - minX
+
+	# get glyph layout of a string, (glyph positions, width), to measure it and draw it with Blit without laying it out twice
+	def Layout(self, text):
+		with self.lock:
+			return self.layout(text)
+
+	# get size of a string rendered from the atlas
+	def Size(self, text):
+		return (self.Layout(text)[1], self.Height)
+
+	# draw a glyph layout (see Layout) onto surface at position, returns the drawn rect
+	def Blit(self, surface, layout, position):
+		placed, width = layout
+		posX, posY = position
+		with self.lock:
+			for area, x in placed:
+				surface.blit(self.Surface, (posX + x, posY), area)
+		return pygame.Rect(posX, posY, width, self.Height)
+
+	# draw a string onto surface at position, returns the drawn rect
+	def Render(self, surface, text, position):
+		return self.Blit(surface, self.Layout(text), position)
+
+	# get bytes of pixel memory held by the atlas
+	def MemoryUsage(self):
+		with self.lock:
+			if self.Surface == None:
+				return 0
+			return self.Surface.get_pitch() * self.Surface.get_height()
+
+# Glyph atlas registry class, keeps atlases by (font, color) in LRU order
+class GlyphAtlasCache:
+
+	# default maximum number of atlases
+	MAXATLASES_DEFAULT = 16
+
+	# constructor
+	def __init__(self, maxAtlases = MAXATLASES_DEFAULT):
+		self.MaxAtlases = maxAtlases
+		self.Hits = 0
+		self.Misses = 0
+		self.Evictions = 0
+		self.atlases = collections.OrderedDict()
+		self.lock = threading.Lock()
+
+	# get atlas for a pygame Font object and text color, creating it on first use
+	def Get(self, font, color):
+		key = (font, tuple(color))
+		with self.lock:
+			atlas = self.atlases.pop(key, None)
+			if atlas != None:
+				self.Hits = self.Hits + 1
+			else:
+				self.Misses = self.Misses + 1
+				atlas = GlyphAtlas(font, color)
+				# evict least recently used atlases
+				while len(self.atlases) >= max(self.MaxAtlases, 1):
+					self.atlases.popitem(False)
+					self.Evictions = self.Evictions + 1
+			# (re)insert as most recently used
+			self.atlases[key] = atlas
+			return atlas
+
+	# drop all atlases
+	def Clear(self):
+		with self.lock:
+			self.atlases.clear()
+
+	# get registry statistics
+	def Stats(self):
+		with self.lock:
+			atlases = list(self.atlases.values())
+			stats = {'atlases': len(atlases), 'maxAtlases': self.MaxAtlases, 'hits': self.Hits, 'misses': self.Misses, 'evictions': self.Evictions}
+		stats['glyphs'] = sum(len(atlas.glyphs) for atlas in atlases)
+		stats['bytes'] = sum(atlas.MemoryUsage() for atlas in atlases)
+		return stats
+
+# shared registry used by touchGUI and textrect
+Atlases = GlyphAtlasCache()
@@ -0,0 +1,199 @@
+# screencapture.py - asynchronous screenshots and rolling frame recorder for touchGUI (based on pygame)
+# frames are copied on the GUI thread and encoded to files by a background worker, so capturing does not stall input
+# the frame recorder keeps the last seconds of display output as a key frame plus changed regions (deltas)
+
+# Imports
+import os
+import time
+import threading
+import collections
+import traceback
+import Queue
+import pygame
+
+# Capture worker class, writes surfaces to image files on a background thread
+class CaptureWorker:
+
+	# default screenshot file name pattern (numbered, the file format follows the extension)
+	SCREENSHOT_PATH = 'screenshot-%04d.tga'
+
+	# default recording dump directory name pattern (numbered)
+	RECORDING_PATH = 'recording-%04d'
+
+	# constructor
+	def __init__(self, screenshotPath = SCREENSHOT_PATH, recordingPath = RECORDING_PATH):
+		self.ScreenshotPath = screenshotPath
+		self.RecordingPath = recordingPath
+		self.Written = 0
+		self.Failed = 0
+		self.numbers = {}		# path pattern -> next number to try
+		self.queue = Queue.Queue()
+		self.worker = None
+		self.lock = threading.Lock()
+
+	# (internal use) get next numbered path for a pattern that does not exist yet
+	def pathNext(self, pattern):
+		with self.lock:
+			number = self.numbers.get(pattern, 1)
+			while os.path.exists(pattern % number):
+				number = number + 1
+			self.numbers[pattern] = number + 1
+			return pattern % number
+
+	# (internal use) queue a job for the worker thread, starting it on first use
+	def jobAdd(self, job):
+		with self.lock:
+			if self.worker == None:
+				self.worker = threading.Thread(target=self.workerLoop)
+				self.worker.daemon = True
+				self.worker.start()
+		self.queue.put(job)
+
+	# (internal use) worker thread, runs queued jobs
+	def workerLoop(self):
+		while True:
+			job = self.queue.get()
+			try:
+				job()
+			except Exception as e:
+				self.Failed = self.Failed + 1
+				print ("Exception in capture worker: " + str(e))
+				print (traceback.format_exc())
+			finally:
+				self.queue.task_done()
+
+	# (internal use) write an image file
+	def imageWrite(self, surface, path):
+		pygame.image.save(surface, path)
+		self.Written = self.Written + 1
+
+	# copy surface and write it to the next numbered screenshot file (or path) in the background, returns the path
+	def Screenshot(self, surface, path = None):
+		if path == None:
+			path = self.pathNext(self.ScreenshotPath)
+		frame = surface.copy()
+		self.jobAdd(lambda: self.imageWrite(frame, path))
+		return path
+
+	# write the frames of a recorder snapshot to the next numbered recording directory (or directory) in the background,
+	# one numbered image per frame plus an index of frame times, returns the directory
+	def RecordingWrite(self, snapshot, directory = None):
+		if snapshot == None:
+			raise ValueError("No recorded frames to write, recording not started or stopped")
+		if directory == None:
+			directory = self.pathNext(self.RecordingPath)
+		self.jobAdd(lambda: self.recordingWrite(snapshot, directory))
+		return directory
+
+	# (internal use) rebuild the recorded frames from key frame and deltas and write them
+	def recordingWrite(self, snapshot, directory):
+		keyTime, frame, deltas = snapshot
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		with open(os.path.join(directory, 'index.txt'), 'w') as indexFile:
+			self.imageWrite(frame, os.path.join(directory, 'frame-0000.tga'))
+			indexFile.write('0 %.3f\n' % keyTime)
+			for number, (frameTime, patches) in enumerate(deltas, 1):
+				for rect, patch in patches:
+					frame.blit(patch, rect)
+				self.imageWrite(frame, os.path.join(directory, 'frame-%04d.tga' % number))
+				indexFile.write('%d %.3f\n' % (number, frameTime))
+
+	# wait until all queued files are written (timeout in seconds, None: no limit), returns False on timeout
+	def Flush(self, timeout = None):
+		deadline = None
+		if timeout != None:
+			deadline = time.time() + timeout
+		while self.queue.unfinished_tasks > 0:
+			if deadline != None and time.time() >= deadline:
+				return False
+			time.sleep(0.01)
+		return True
+
+	# get worker statistics
+	def Stats(self):
+		return {'queued': self.queue.unfinished_tasks, 'written': self.Written, 'failed': self.Failed}
+
+# Frame recorder class, keeps recent display output in a memory bounded ring buffer
+# frames are stored as the changed regions of each present, the oldest deltas are folded into the key frame
+class FrameRecorder:
+
+	# default recording length (seconds) and memory limit (bytes)
+	SECONDS_DEFAULT = 10
+	MAXBYTES_DEFAULT = 16 * 1024 * 1024
+
+	# constructor
+	def __init__(self, seconds = SECONDS_DEFAULT, maxBytes = MAXBYTES_DEFAULT):
+		self.Seconds = seconds
+		self.MaxBytes = maxBytes
+		self.Frames = 0
+		self.keyFrame = None
+		self.keyTime = None
+		self.deltas = collections.deque()	# (time, [(rect, patch surface)], bytes), oldest first
+		self.deltaBytes = 0
+		self.lock = threading.Lock()
+
+	# (internal use) get bytes of pixel memory held by a surface
+	def surfaceBytes(self, surface):
+		return surface.get_pitch() * surface.get_height()
+
+	# start recording with the current contents of surface as key frame
+	def Start(self, surface):
+		with self.lock:
+			self.keyFrame = surface.copy()
+			self.keyTime = time.time()
+			self.deltas.clear()
+			self.deltaBytes = 0
+			self.Frames = 0
+
+	# record the regions of surface changed by a present
+	def FrameAdd(self, surface, rects):
+		frameTime = time.time()
+		bounds = surface.get_rect()
+		patches = []
+		patchBytes = 0
+		for rect in rects:
+			rect = pygame.Rect(rect).clip(bounds)
+			if rect.width > 0 and rect.height > 0:
+				patch = surface.subsurface(rect).copy()
+				patches.append((rect, patch))
+				patchBytes = patchBytes + self.surfaceBytes(patch)
+		with self.lock:
+			if self.keyFrame == None:
+				return
+			self.deltas.append((frameTime, patches, patchBytes))
+			self.deltaBytes = self.deltaBytes + patchBytes
+			self.Frames = self.Frames + 1
+			self.trim(frameTime)
+
+	# (internal use) fold deltas older than Seconds or over MaxBytes into the key frame (lock held)
+	def trim(self, now):
+		while len(self.deltas) > 0 and (self.deltas[0][0] < now - self.Seconds or self.deltaBytes + self.surfaceBytes(self.keyFrame) > self.MaxBytes):
+			frameTime, patches, patchBytes = self.deltas.popleft()
+			for rect, patch in patches:
+				self.keyFrame.blit(patch, rect)
+			self.keyTime = frameTime
+			self.deltaBytes = self.deltaBytes - patchBytes
+
+	# get recorded frames as (key frame time, key frame copy, [(time, [(rect, patch)])]), None if not recording
+	def Snapshot(self):
+		with self.lock:
+			if self.keyFrame == None:
+				return None
+			return (self.keyTime, self.keyFrame.copy(), [(frameTime, patches) for frameTime, patches, patchBytes in self.deltas])
+
+	# stop recording, dropping the recorded frames
+	def Stop(self):
+		with self.lock:
+			self.keyFrame = None
+			self.deltas.clear()
+			self.deltaBytes = 0
+
+	# get recorder statistics
+	def Stats(self):
+		with self.lock:
+			keyBytes = 0
+			if self.keyFrame != None:
+				keyBytes = self.surfaceBytes(self.keyFrame)
+			return {'frames': len(self.deltas) + (self.keyFrame != None), 'recorded': self.Frames, 'bytes': keyBytes + self.deltaBytes,
+				'maxBytes': self.MaxBytes, 'seconds': self.Seconds}
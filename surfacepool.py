@@ -0,0 +1,108 @@
+# surfacepool.py - pool of offscreen surfaces for touchGUI (based on pygame)
+# surfaces released to the pool are handed out again for the same size and pixel format,
+# so page switches and text rendering do not allocate (and fragment) pixel memory all the time
+
+# Imports
+import threading
+import collections
+import pygame
+
+# Surface pool class, keeps released surfaces by size and pixel format
+class SurfacePool:
+
+	# default maximum bytes of pixel memory retained by released surfaces
+	MAXBYTES_DEFAULT = 8 * 1024 * 1024
+
+	# constructor
+	def __init__(self, maxBytes = MAXBYTES_DEFAULT):
+		self.MaxBytes = maxBytes
+		self.Acquired = 0
+		self.Reused = 0
+		self.Released = 0
+		self.Discarded = 0
+		self.retainedBytes = 0
+		self.surfaces = {}			# (size, pixel format) -> list of released surfaces
+		self.released = collections.OrderedDict()	# id(surface) -> (key, surface), least recently released first
+		self.lock = threading.Lock()
+
+	# (internal use) get pool key of a surface
+	def keyGet(self, surface):
+		return (surface.get_size(), surface.get_bitsize(), surface.get_masks(), surface.get_flags() & pygame.SRCALPHA)
+
+	# (internal use) get bytes of pixel memory held by a surface
+	def surfaceBytes(self, surface):
+		return surface.get_pitch() * surface.get_height()
+
+	# get a surface of size in the display's pixel format (default format if no display mode is set)
+	# the surface is cleared to black unless clear is False (contents are undefined then, for callers that overwrite all of it)
+	# clip rect and colorkey of reused surfaces are reset
+	def Acquire(self, size, clear = True):
+		size = (int(size[0]), int(size[1]))
+		display = pygame.display.get_surface()
+		if display == None:
+			# no display format to match, not pooled
+			return pygame.Surface(size)
+		key = (size, display.get_bitsize(), display.get_masks(), 0)
+		with self.lock:
+			self.Acquired = self.Acquired + 1
+			surfaces = self.surfaces.get(key)
+			if surfaces:
+				surface = surfaces.pop()
+				if len(surfaces) == 0:
+					del self.surfaces[key]
+				del self.released[id(surface)]
+				self.retainedBytes = self.retainedBytes - self.surfaceBytes(surface)
+				self.Reused = self.Reused + 1
+				surface.set_clip(None)
+				surface.set_colorkey(None)
+				if clear == True:
+					surface.fill((0, 0, 0))
+				return surface
+		return pygame.Surface(size).convert()
+
+	# give a surface back to the pool (it must not be used by the caller anymore)
+	def Release(self, surface):
+		if surface == None:
+			return
+		key = self.keyGet(surface)
+		with self.lock:
+			if id(surface) in self.released:
+				return
+			self.Released = self.Released + 1
+			self.surfaces.setdefault(key, []).append(surface)
+			self.released[id(surface)] = (key, surface)
+			self.retainedBytes = self.retainedBytes + self.surfaceBytes(surface)
+			self.trim()
+
+	# (internal use) drop least recently released surfaces while over MaxBytes, lock held
+	def trim(self):
+		while self.retainedBytes > self.MaxBytes and len(self.released) > 0:
+			surfaceId, (key, surface) = self.released.popitem(False)
+			surfaces = self.surfaces[key]
+			surfaces.remove(surface)
+			if len(surfaces) == 0:
+				del self.surfaces[key]
+			self.retainedBytes = self.retainedBytes - self.surfaceBytes(surface)
+			self.Discarded = self.Discarded + 1
+
+	# set maximum retained bytes, dropping surfaces over the new cap
+	def MaxBytesSet(self, maxBytes):
+		with self.lock:
+			self.MaxBytes = maxBytes
+			self.trim()
+
+	# drop all released surfaces
+	def Clear(self):
+		with self.lock:
+			self.surfaces = {}
+			self.released.clear()
+			self.retainedBytes = 0
+
+	# get pool statistics
+	def Stats(self):
+		with self.lock:
+			return {'surfaces': len(self.released), 'bytes': self.retainedBytes, 'maxBytes': self.MaxBytes,
+				'acquired': self.Acquired, 'reused': self.Reused, 'released': self.Released, 'discarded': self.Discarded}
+
+# shared pool used by touchGUI and textrect
+Surfaces = SurfacePool()
@@ -0,0 +1,96 @@
+# test_fbdisplay.py - framebuffer display backend tests against a file backed framebuffer
+#   python -m unittest discover -s tests
+
+# Imports
+import os
+import sys
+import tempfile
+import unittest
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pygame
+import fbdisplay
+
+# framebuffer geometry, lines padded beyond the visible width
+WIDTH = 37
+HEIGHT = 11
+PADDING = 6		# bytes per line
+PADDING_BYTE = '\xab'
+
+# Framebuffer round trip tests: render a known surface, present it, read the file back
+class FramebufferRoundTripTest(unittest.TestCase):
+
+	def setUp(self):
+		pygame.display.init()
+		self.fbFile = tempfile.NamedTemporaryFile(prefix = 'touchGUI-fb-')
+
+	def tearDown(self):
+		self.fbFile.close()
+		pygame.display.quit()
+
+	# (internal use) open a display on a padding filled framebuffer file
+	def displayOpen(self, bitsPerPixel):
+		lineLength = WIDTH * bitsPerPixel // 8 + PADDING
+		self.fbFile.write(PADDING_BYTE * (lineLength * HEIGHT))
+		self.fbFile.flush()
+		display = fbdisplay.FramebufferDisplay(self.fbFile.name, (WIDTH, HEIGHT), bitsPerPixel, lineLength)
+		surface = display.Open()
+		return display, surface, lineLength
+
+	# (internal use) draw a pattern covering all color channels
+	def patternDraw(self, surface):
+		for y in range(HEIGHT):
+			for x in range(WIDTH):
+				surface.set_at((x, y), ((x * 7) % 256, (y * 23) % 256, ((x + y) * 11) % 256))
+
+	# (internal use) read the framebuffer file back as lines
+	def linesRead(self, lineLength):
+		with open(self.fbFile.name, 'rb') as fbFile:
+			data = fbFile.read()
+		return [data[y * lineLength:(y + 1) * lineLength] for y in range(HEIGHT)]
+
+	def testRGB565(self):
+		display, surface, lineLength = self.displayOpen(fbdisplay.PIXELFORMAT_RGB565)
+		self.patternDraw(surface)
+		display.Update([surface.get_rect()])
+		display.Close()
+		for y, line in enumerate(self.linesRead(lineLength)):
+			for x in range(WIDTH):
+				red, green, blue, alpha = surface.get_at((x, y))
+				expected = ((red >> 3) << 11) | ((green >> 2) << 5) | (blue >> 3)
+				value = ord(line[x * 2]) | (ord(line[x * 2 + 1]) << 8)
+				self.assertEqual(value, expected, 'pixel %d,%d' % (x, y))
+			self.assertEqual(line[WIDTH * 2:], PADDING_BYTE * PADDING, 'padding of line %d' % y)
+
+	def testXRGB8888(self):
+		display, surface, lineLength = self.displayOpen(fbdisplay.PIXELFORMAT_XRGB8888)
+		self.patternDraw(surface)
+		display.Update([surface.get_rect()])
+		display.Close()
+		for y, line in enumerate(self.linesRead(lineLength)):
+			for x in range(WIDTH):
+				red, green, blue, alpha = surface.get_at((x, y))
+				self.assertEqual(map(ord, line[x * 4:x * 4 + 3]), [blue, green, red], 'pixel %d,%d' % (x, y))
+			self.assertEqual(line[WIDTH * 4:], PADDING_BYTE * PADDING, 'padding of line %d' % y)
+
+	def testPartialUpdate(self):
+		display, surface, lineLength = self.displayOpen(fbdisplay.PIXELFORMAT_RGB565)
+		surface.fill((255, 255, 255))
+		display.Update([pygame.Rect(3, 2, 5, 4)])
+		display.Close()
+		for y, line in enumerate(self.linesRead(lineLength)):
+			for x in range(WIDTH):
+				if 3 <= x < 8 and 2 <= y < 6:
+					expected = '\xff\xff'
+				else:
+					expected = PADDING_BYTE * 2
+				self.assertEqual(line[x * 2:x * 2 + 2], expected, 'pixel %d,%d' % (x, y))
+
+	def testOpenUsesFramebufferDepth(self):
+		display, surface, lineLength = self.displayOpen(fbdisplay.PIXELFORMAT_RGB565)
+		self.assertEqual(pygame.display.get_surface().get_bitsize(), fbdisplay.PIXELFORMAT_RGB565)
+		self.assertEqual(surface.get_bitsize(), fbdisplay.PIXELFORMAT_RGB565)
+		display.Close()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,137 @@
+# test_textrect.py - word wrapping tests, compares wrap_lines with the original per line measuring wrapper
+#   python -m unittest discover -s tests
+
+# Imports
+import os
+import sys
+import unittest
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pygame
+import textrect
+
+# sample texts
+TEXT_WORDS = "level frequency tuner squelch carrier offset band channel antenna power"
+TEXT_KERNING = "AV To Ta We Yo LT Wa AVAVAV Tj ff fi"
+TEXT_NEWLINES = "Tuner frequency\nout of range,\n\nplease enter a value within the limits\n"
+TEXT_SPACES = "two  spaces and  more   spaces "
+TEXT_LONGWORD = "a supercalifragilisticexpialidocious word"
+
+# original wrapper, measures every growing line with font.size()
+def wrapLinesReference(string, font, width):
+	finalLines = []
+	for requestedLine in string.splitlines():
+		if font.size(requestedLine)[0] > width:
+			words = requestedLine.split(' ')
+			for word in words:
+				if font.size(word)[0] >= width:
+					raise textrect.TextRectException, "The word " + word + " is too long to fit in the rect passed."
+			accumulatedLine = ""
+			for word in words:
+				testLine = accumulatedLine + word + " "
+				if font.size(testLine)[0] < width:
+					accumulatedLine = testLine
+				else:
+					finalLines.append(accumulatedLine)
+					accumulatedLine = word + " "
+			finalLines.append(accumulatedLine)
+		else:
+			finalLines.append(requestedLine)
+	return [(line, font.size(line)[1]) for line in finalLines]
+
+# Word wrap tests
+class WrapLinesTest(unittest.TestCase):
+
+	def setUp(self):
+		pygame.font.init()
+		self.fonts = [pygame.font.Font(None, size) for size in (12, 19, 24, 41)]
+
+	def tearDown(self):
+		pygame.font.quit()
+
+	# compare both wrappers, including the exception raised for words that do not fit
+	def assertWrapEqual(self, string, font, width):
+		try:
+			expected = wrapLinesReference(string, font, width)
+		except textrect.TextRectException as e:
+			with self.assertRaises(textrect.TextRectException) as context:
+				textrect.wrap_lines(string, font, width)
+			self.assertEqual(str(context.exception), str(e))
+			return
+		self.assertEqual(textrect.wrap_lines(string, font, width), expected, 'width %d: %r' % (width, string))
+
+	# all widths from too narrow for any word to wide enough for the whole text
+	def assertWrapEqualWidths(self, string):
+		for font in self.fonts:
+			for width in range(1, font.size(string)[0] + 2):
+				self.assertWrapEqual(string, font, width)
+
+	def testWords(self):
+		self.assertWrapEqualWidths(TEXT_WORDS)
+
+	def testKerning(self):
+		self.assertWrapEqualWidths(TEXT_KERNING)
+
+	def testNewlines(self):
+		self.assertWrapEqualWidths(TEXT_NEWLINES)
+
+	def testSpaces(self):
+		self.assertWrapEqualWidths(TEXT_SPACES)
+
+	def testLongWord(self):
+		for font in self.fonts:
+			width = font.size("supercalifragilisticexpialidocious")[0]
+			with self.assertRaises(textrect.TextRectException):
+				textrect.wrap_lines(TEXT_LONGWORD, font, width)
+			self.assertWrapEqual(TEXT_LONGWORD, font, width)
+			self.assertWrapEqual(TEXT_LONGWORD, font, width + 1)
+
+	# widths where a line or a line plus its trailing space fits exactly
+	def testExactFit(self):
+		for font in self.fonts:
+			for string in (TEXT_WORDS, TEXT_KERNING, TEXT_NEWLINES):
+				widths = set()
+				words = string.replace('\n', ' ').split(' ')
+				for first in range(len(words)):
+					for last in range(first + 1, len(words) + 1):
+						line = " ".join(words[first:last])
+						widths.add(font.size(line)[0])
+						widths.add(font.size(line + " ")[0])
+				for width in sorted(widths):
+					for delta in (-1, 0, 1):
+						self.assertWrapEqual(string, font, width + delta)
+
+# In place drawing tests
+class DrawTextrectTest(unittest.TestCase):
+
+	def setUp(self):
+		pygame.font.init()
+		self.font = pygame.font.Font(None, 24)
+
+	def tearDown(self):
+		pygame.font.quit()
+
+	# drawing into a rect gives the pixels of the rendered text surface, leaving the rest of the surface untouched
+	def testSameAsRendered(self):
+		rect = pygame.Rect(0, 0, 150, 120)
+		for justification in (0, 1, 2):
+			rendered = textrect.render_textrect_uncached(TEXT_NEWLINES, self.font, rect, (0, 255, 0), (0, 0, 64), justification)
+			surface = pygame.Surface((200, 200), 0, rendered)
+			surface.fill((255, 0, 255))
+			textrect.draw_textrect(surface, TEXT_NEWLINES, self.font, rect.move(30, 40), (0, 255, 0), (0, 0, 64), justification)
+			expected = surface.copy()
+			expected.fill((255, 0, 255))
+			expected.blit(rendered, (30, 40))
+			self.assertEqual(pygame.image.tostring(surface, 'RGB'), pygame.image.tostring(expected, 'RGB'))
+
+	# text that does not fit draws nothing
+	def testTooTall(self):
+		surface = pygame.Surface((200, 200), 0, 32)
+		surface.fill((255, 0, 255))
+		before = pygame.image.tostring(surface, 'RGB')
+		with self.assertRaises(textrect.TextRectException):
+			textrect.draw_textrect(surface, TEXT_WORDS, self.font, pygame.Rect(10, 10, 100, 30), (0, 255, 0), (0, 0, 0))
+		self.assertEqual(pygame.image.tostring(surface, 'RGB'), before)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -7,7 +7,185 @@ class TextRectException:
     def __str__(self):
         return self.message
 
-def render_textrect(string, font, rect, text_color, background_color, justification=0):
+class TextSurfaceCache:
+    """Bounded LRU cache of finished text surfaces.
+
+    Entries are evicted least recently used first once the summed pixel
+    memory of the cached surfaces exceeds budget (in bytes). Surfaces that
+    are larger than the whole budget are not cached. Evicted surfaces are
+    not given back to the shared surface pool, since callers of
+    render_textrect may still hold them.
+    """
+
+    def __init__(self, budget=4 * 1024 * 1024):
+        import threading
+        import collections
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            surface = self.entries.pop(key, None)
+            if surface is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries[key] = surface
+            return surface
+
+    def put(self, key, surface):
+        size = surface.get_pitch() * surface.get_height()
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= old.get_pitch() * old.get_height()
+            if size > self.budget:
+                return
+            self.entries[key] = surface
+            self.used += size
+            self.trim()
+
+    def trim(self):
+        # caller holds the lock
+        while self.used > self.budget and self.entries:
+            key, surface = self.entries.popitem(False)
+            self.used -= surface.get_pitch() * surface.get_height()
+            self.evictions += 1
+
+    def set_budget(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.trim()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.used, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+# shared text surface cache used by render_textrect
+surface_cache = TextSurfaceCache()
+
+def set_cache_budget(budget):
+    """Sets the memory budget (in bytes) of the text surface cache.
+    A budget of 0 disables caching."""
+    surface_cache.set_budget(budget)
+
+def clear_cache():
+    """Drops all cached text surfaces."""
+    surface_cache.clear()
+
+def cache_stats():
+    """Returns a dict with text surface cache statistics."""
+    return surface_cache.stats()
+
+def render_textrect(string, font, rect, text_color, background_color, justification=0, glyph_atlas=False):
+    """Returns a surface containing the passed text string, reformatted
+    to fit within the given rect, word-wrapping as necessary. The text
+    will be anti-aliased.
+
+    Identical requests are answered from a shared LRU cache of finished
+    surfaces (see set_cache_budget), so the returned surface must be
+    treated as read-only by the caller. Arguments and return values are
+    the same as for render_textrect_uncached.
+
+    Glyph atlas text is not cached: it is meant for fast changing text,
+    which would only churn the cache (see draw_textrect).
+    """
+
+    if glyph_atlas:
+        return render_textrect_uncached(string, font, rect, text_color, background_color, justification, glyph_atlas)
+
+    # resolve font specification through the shared font registry
+    if isinstance(font, tuple):
+        import fontcache
+        font = fontcache.Fonts.Get(*font)
+
+    # the font object itself is part of the key; holding a reference to it
+    # keeps its identity from being reused by another font
+    key = (string, font, rect.width, rect.height, tuple(text_color), tuple(background_color), justification, glyph_atlas)
+    surface = surface_cache.get(key)
+    if surface is None:
+        surface = render_textrect_uncached(string, font, rect, text_color, background_color, justification, glyph_atlas)
+        surface_cache.put(key, surface)
+    return surface
+
+def wrap_lines(string, font, width):
+    """Splits the string into lines that fit within width pixels, word-wrapping
+    as necessary, and returns a list of (line, height) tuples.
+
+    Every distinct word is measured once, both as the first word of a line
+    ("word ") and following a space (" word " minus the space), which
+    accounts for kerning against the separating space and the leading
+    bearing of the first glyph. Lines are then packed greedily from those
+    widths, so wrapping takes time linear in the length of the string and
+    gives the same lines as measuring each growing line with font.size().
+
+    Raises a TextRectException if a single word is too wide for width.
+    """
+
+    final_lines = []
+    word_metrics = {}
+    space_width = font.size(" ")[0]
+    empty_height = None
+
+    for requested_line in string.splitlines():
+        line_width, line_height = font.size(requested_line)
+        if line_width <= width:
+            final_lines.append((requested_line, line_height))
+            continue
+
+        # measure every distinct word once
+        words = requested_line.split(' ')
+        metrics = []
+        for word in words:
+            metric = word_metrics.get(word)
+            if metric is None:
+                lead_width, word_height = font.size(word + " ")
+                follow_width = font.size(" " + word + " ")[0] - space_width
+                # if any of our words are too long to fit, return.
+                if lead_width >= width and font.size(word)[0] >= width:
+                    raise TextRectException, "The word " + word + " is too long to fit in the rect passed."
+                metric = word_metrics[word] = (lead_width, follow_width, word_height)
+            metrics.append(metric)
+
+        # pack words into lines while they fit (each followed by a space)
+        accumulated_words = []
+        accumulated_width = 0
+        accumulated_height = 0
+        for word, (lead_width, follow_width, word_height) in zip(words, metrics):
+            if accumulated_words:
+                test_width = accumulated_width + follow_width
+            else:
+                test_width = lead_width
+            if test_width < width:
+                accumulated_words.append(word)
+                accumulated_width = test_width
+                accumulated_height = max(accumulated_height, word_height)
+            else:
+                if accumulated_words:
+                    final_lines.append((" ".join(accumulated_words) + " ", accumulated_height))
+                else:
+                    if empty_height is None:
+                        empty_height = font.size("")[1]
+                    final_lines.append(("", empty_height))
+                accumulated_words = [word]
+                accumulated_width = lead_width
+                accumulated_height = word_height
+        final_lines.append((" ".join(accumulated_words) + " ", accumulated_height))
+
+    return final_lines
+
+def render_textrect_uncached(string, font, rect, text_color, background_color, justification=0, glyph_atlas=False):
     """Returns a surface containing the passed text string, reformatted
     to fit within the given rect, word-wrapping as necessary. The text
     will be anti-aliased.
@@ -15,7 +193,8 @@ def render_textrect(string, font, rect, text_color, background_color, justificat
     Takes the following arguments:
 
     string - the text you wish to render. \n begins a new line.
-    font - a Font object
+    font - a Font object, or a (path, size) / (path, size, style) tuple
+           which is looked up in the shared fontcache registry
     rect - a rectstyle giving the size of the surface requested.
     text_color - a three-byte tuple of the rgb value of the
                  text color. ex (0, 0, 0) = BLACK
@@ -23,72 +202,94 @@ def render_textrect(string, font, rect, text_color, background_color, justificat
     justification - 0 (default) left-justified
                     1 horizontally centered
                     2 right-justified
+    glyph_atlas - if true, lines are composed from the shared glyph atlas
+                  (glyphatlas.Atlases) instead of being rasterized as a
+                  whole, which is cheaper for frequently changing text
+                  with few distinct characters (e.g. numeric readouts)
 
     Returns the following values:
 
-    Success - a surface object with the text rendered onto it.
+    Success - a surface object with the text rendered onto it, in the
+              pixel format of the display (if a display mode is set).
     Failure - raises a TextRectException if the text won't fit onto the surface.
     """
 
-    import pygame
+    # surfaces in the display's pixel format are reused through the shared pool
+    import surfacepool
+    surface = surfacepool.Surfaces.Acquire(rect.size, False)
+    try:
+        draw_textrect(surface, string, font, surface.get_rect(), text_color, background_color, justification, glyph_atlas)
+    except:
+        # not handed out, give the surface back to the pool
+        surfacepool.Surfaces.Release(surface)
+        raise
 
-    final_lines = []
+    return surface
 
-    requested_lines = string.splitlines()
+def draw_textrect(surface, string, font, rect, text_color, background_color, justification=0, glyph_atlas=False):
+    """Draws the passed text string into rect on surface, word-wrapping
+    as necessary, the same way render_textrect_uncached renders it onto
+    its own surface. Drawing in place needs no intermediate surface,
+    which suits frequently changing text drawn from the glyph atlas.
 
-    # Create a series of lines that will fit on the provided
-    # rectangle.
+    Takes the arguments of render_textrect_uncached, plus the surface to
+    draw on; rect gives the position and size of the text area on it.
+    Nothing is drawn if a TextRectException is raised.
+    """
 
-    for requested_line in requested_lines:
-        if font.size(requested_line)[0] > rect.width:
-            words = requested_line.split(' ')
-            # if any of our words are too long to fit, return.
-            for word in words:
-                if font.size(word)[0] >= rect.width:
-                    raise TextRectException, "The word " + word + " is too long to fit in the rect passed."
-            # Start a new line
-            accumulated_line = ""
-            for word in words:
-                test_line = accumulated_line + word + " "
-                # Build the line while the words fit.
-                if font.size(test_line)[0] < rect.width:
-                    accumulated_line = test_line
-                else:
-                    final_lines.append(accumulated_line)
-                    accumulated_line = word + " "
-            final_lines.append(accumulated_line)
-        else:
-            final_lines.append(requested_line)
+    import pygame
+
+    # resolve font specification through the shared font registry
+    if isinstance(font, tuple):
+        import fontcache
+        font = fontcache.Fonts.Get(*font)
+
+    final_lines = wrap_lines(string, font, rect.width)
 
     # determine full height
     accumulated_height = 0
-    for line in final_lines:
-        accumulated_height += font.size(line)[1]
+    for line, line_height in final_lines:
+        accumulated_height += line_height
+    # check fit before drawing anything
+    if final_lines and accumulated_height >= rect.height:
+        raise TextRectException, "Once word-wrapped, the text string was too tall to fit in the rect."
+    if justification not in (0, 1, 2):
+        raise TextRectException, "Invalid justification argument: " + str(justification)
     # center vertically
     offsetY = ((rect.height - accumulated_height) / 2)
 
 
-    # Let's try to write the text out on the surface.
-
-    surface = pygame.Surface(rect.size)
-    surface.fill(background_color)
+    # Let's write the text out on the surface.
 
-    accumulated_height = 0
-    for line in final_lines:
-        if accumulated_height + font.size(line)[1] >= rect.height:
-            raise TextRectException, "Once word-wrapped, the text string was too tall to fit in the rect."
-        if line != "":
-            tempsurface = font.render(line, 1, text_color)
-            if justification == 0:
-                surface.blit(tempsurface, (0, accumulated_height + offsetY))
-            elif justification == 1:
-                surface.blit(tempsurface, ((rect.width - tempsurface.get_width()) / 2, accumulated_height + offsetY))
-            elif justification == 2:
-                surface.blit(tempsurface, (rect.width - tempsurface.get_width(), accumulated_height + offsetY))
-            else:
-                raise TextRectException, "Invalid justification argument: " + str(justification)
-        accumulated_height += font.size(line)[1]
-
-    return surface
+    clip = surface.get_clip()
+    surface.set_clip(rect.clip(clip))
+    try:
+        surface.fill(background_color, rect)
 
+        if glyph_atlas:
+            import glyphatlas
+            atlas = glyphatlas.Atlases.Get(font, text_color)
 
+        accumulated_height = 0
+        for line, line_height in final_lines:
+            if line != "":
+                if glyph_atlas:
+                    layout = atlas.Layout(line)
+                    line_width = layout[1]
+                else:
+                    # composite onto the background while rendering, no alpha blending needed
+                    tempsurface = font.render(line, 1, text_color, background_color)
+                    line_width = tempsurface.get_width()
+                if justification == 0:
+                    position = (rect.x, rect.y + accumulated_height + offsetY)
+                elif justification == 1:
+                    position = (rect.x + (rect.width - line_width) / 2, rect.y + accumulated_height + offsetY)
+                else:
+                    position = (rect.x + rect.width - line_width, rect.y + accumulated_height + offsetY)
+                if glyph_atlas:
+                    atlas.Blit(surface, layout, position)
+                else:
+                    surface.blit(tempsurface, position)
+            accumulated_height += line_height
+    finally:
+        surface.set_clip(clip)
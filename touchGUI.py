@@ -6,16 +6,46 @@
 
 # Imports
 import os
+import sys
+import types
 import pygame
 import textrect
+import fontcache
+import surfacepool
+import glyphatlas
+import screencapture
 import threading
 import time
 import traceback
 import functools
+import bisect
+import heapq
+import itertools
+import collections
+import contextlib
+
+# create an offscreen surface in the display's pixel format (default format if no display mode is set)
+# surfaces come from the shared surface pool, cleared to black (contents undefined if clear is False)
+def SurfaceCreate(size, clear = True):
+	return surfacepool.Surfaces.Acquire(size, clear)
+
+# give an offscreen surface that is no longer used back to the shared surface pool
+def SurfaceRelease(surface):
+	surfacepool.Surfaces.Release(surface)
+
+# (internal use) get bytes of pixel memory held by a surface
+def surfaceBytes(surface):
+	return surface.get_pitch() * surface.get_height()
 
 # GUI element base class
 class GUIElement:
 
+	# attributes that define the element's position and size
+	GEOMETRY_ATTRIBUTES = frozenset(('PosX', 'PosY', 'SizeX', 'SizeY'))
+
+	# public attributes that do not affect the element's appearance (changing them does not mark it dirty in a batch)
+	NONVISUAL_ATTRIBUTES = frozenset(('Name', 'Surface', 'Page', 'Parent', 'OnClick', 'OnRelease', 'OnCancel'))
+
         def __init__(self, elementName, posX, posY, sizeX, sizeY):
                 self.Name = elementName
                 self.PosX = posX
@@ -24,10 +54,75 @@ class GUIElement:
                 self.SizeY = sizeY
                 self.Surface = None
 		self.Visible = True
+		self.Page = None		# page the element is on
+		self.Parent = None		# page or container the element was added to
 
         def RenderingSurfaceSet(self, renderingSurface):
                 self.Surface = renderingSurface
 
+	# attribute assignment hook, notifies the parent when the element is moved or resized
+	# and marks the element dirty when a public attribute changes during a page update batch
+	def __setattr__(self, name, value):
+		page = self.__dict__.get('Page')
+		if page != None and page.updateLevel > 0 and name[0].isupper() and name not in self.NONVISUAL_ATTRIBUTES:
+			if name not in self.__dict__ or self.__dict__[name] != value:
+				page.ElementDirty(self)
+		self.__dict__[name] = value
+		if name in self.GEOMETRY_ATTRIBUTES:
+			parent = self.__dict__.get('Parent')
+			if parent != None:
+				parent.ElementMoved(self)
+
+	# (internal use) report a region of the rendering surface as changed, returns the region
+	def DirtyRectAdd(self, rect):
+		if self.Parent != None:
+			self.Parent.ElementRendered(self, rect)
+		return rect
+
+	# (internal use) save the pixels under the element before drawing it visible
+	def BackgroundCapture(self):
+		if self.Parent != None:
+			self.Parent.ElementBackgroundCapture(self)
+
+	# (internal use) put back the pixels under the element when hidden, returns False if the element has to erase itself
+	def BackgroundRestore(self):
+		if self.Parent != None:
+			return self.Parent.ElementBackgroundRestore(self)
+		return False
+
+	# request re-rendering on the GUI thread (thread safe), renders immediately if not attached to a GUI
+	# during a page update batch the element is rendered when the batch ends
+	def Invalidate(self):
+		page = self.Page
+		if page != None and page.updateLevel > 0:
+			page.ElementDirty(self)
+			return
+		gui = self.GUIGet()
+		if gui != None:
+			gui.Invalidate(self)
+		else:
+			self.Render()
+
+	# (internal use) get the GUI object the element is attached to (None if not attached)
+	def GUIGet(self):
+		if self.Parent != None:
+			return self.Parent.GUIGet()
+		return None
+
+	# (internal use) present changed regions of the display
+	def DisplayUpdate(self):
+		gui = self.GUIGet()
+		if gui != None:
+			gui.Update()
+
+	# get bytes held by cached surfaces of the element
+	def CacheBytes(self):
+		return 0
+
+	# drop cached surfaces of the element (they are recreated when needed)
+	def CacheDrop(self):
+		pass
+
 # Clickable GUI element base class, derives from GUIElement
 class GUIClickableElement(GUIElement):
 
@@ -35,14 +130,66 @@ class GUIClickableElement(GUIElement):
 	def __init__(self, elementName, posX, posY, sizeX, sizeY, onClick):
 		GUIElement.__init__(self, elementName, posX, posY, sizeX, sizeY)
 		self.OnClick = onClick
+		self.OnRelease = None		# touch released on the element
+		self.OnCancel = None		# touch moved off the element or was interrupted
 		self.Clicked = False
 		self.Enabled = True
+		self.Pending = False		# a task started by a handler is running (see GUITask)
+		self.pendingTasks = 0
 
-	# (internal use) click method, invokes OnClick handler if element is enabled
+	# hit test, returns True if the display position lies on the element
+	def HitTest(self, posX, posY):
+		return (posX > (self.PosX + 3)) and (posX < (self.PosX + self.SizeX - 3)) and (posY > (self.PosY + 2)) and (posY < (self.PosY + self.SizeY - 2))
+
+	# (internal use) click method, invokes OnClick handler if element is enabled (and no handler task is pending)
 	def click(self):
-		if self.Enabled == True:
+		if self.Enabled == True and self.Pending == False:
 			if self.OnClick != None:
-				self.OnClick()
+				self.handlerInvoke(self.OnClick)
+
+	# (internal use) touch pressed on the element, clicks it
+	def press(self, posX, posY):
+		self.click()
+
+	# (internal use) touch released on the element, invokes OnRelease handler if applicable
+	def release(self, posX, posY):
+		if self.OnRelease != None:
+			self.handlerInvoke(self.OnRelease)
+
+	# (internal use) touch moved off the element or was interrupted before release, invokes OnCancel handler if applicable
+	def cancel(self):
+		if self.OnCancel != None:
+			self.handlerInvoke(self.OnCancel)
+
+	# (internal use) invoke an event handler, returns the handler's task if it started one
+	# generator handlers are run as GUI tasks, the element is pending while a returned task runs
+	# (without a GUI, generator handlers are run to completion right away)
+	def handlerInvoke(self, handler, *args):
+		result = handler(*args)
+		if isinstance(result, types.GeneratorType):
+			gui = self.GUIGet()
+			if gui == None:
+				for awaited in result:
+					pass
+				return None
+			result = gui.TaskStart(result)
+		if isinstance(result, GUITask):
+			self.taskPending(result)
+			return result
+		return None
+
+	# (internal use) show the element as pending until task is done
+	def taskPending(self, task):
+		self.pendingTasks = self.pendingTasks + 1
+		self.Pending = True
+		task.DoneCallbackAdd(self.taskDone)
+
+	# (internal use) task started by a handler is done, render normal appearance after the last one
+	def taskDone(self, task):
+		self.pendingTasks = self.pendingTasks - 1
+		if self.pendingTasks == 0:
+			self.Pending = False
+			self.Invalidate()
 
 
 # GUI button class, derives from GUIClickableElement class
@@ -69,8 +216,24 @@ class GUIButton(GUIClickableElement):
 	# default font size
         FONT_REGULAR_SIZE = 30
 
+	# click flash duration (seconds)
+	CLICK_FLASH_TIME = 0.1
+
+	# button visual states (one cached sprite per state)
+	BUTTONSTATE_INACTIVE = 0
+	BUTTONSTATE_ACTIVE = 1
+	BUTTONSTATE_CLICKED = 2
+	BUTTONSTATE_DISABLED = 3
+
+	# attributes that change the button's appearance (invalidate cached sprites)
+	SPRITE_ATTRIBUTES = frozenset(('Text', 'SizeX', 'SizeY', 'FontPath', 'FontSize', 'FontStyle',
+		'ColorBorderInactive', 'ColorBorderActive', 'ColorBorderClick', 'ColorBorderDisabled',
+		'ColorBodyInactive', 'ColorBodyActive', 'ColorBodyClick', 'ColorBodyDisabled',
+		'ColorTextInactive', 'ColorTextActive', 'ColorTextClick', 'ColorTextDisabled'))
+
         # constructor, returns created object
         def __init__(self, elementName, posX, posY, sizeX, sizeY, buttonText, onClick):
+		self.sprites = {}
 		GUIClickableElement.__init__(self, elementName, posX, posY, sizeX, sizeY, onClick)
                 self.Text = buttonText
 		self.Active = False
@@ -90,85 +253,146 @@ class GUIButton(GUIClickableElement):
 		self.ColorBackground = self.COLOR_BKGRND
                 self.FontPath = self.FONT_REGULAR_PATH
                 self.FontSize = self.FONT_REGULAR_SIZE
-
-
-        # render method draws the button to the display
-        def Render(self):
-
-                # determine color scheme according to button status
+		self.FontStyle = fontcache.FONTSTYLE_NORMAL
+		self.ClickFlashTime = self.CLICK_FLASH_TIME
+		self.clickResetTimer = None
+
+
+	# attribute assignment hook, drops cached state sprites when the button's appearance changes
+	def __setattr__(self, name, value):
+		if name in self.SPRITE_ATTRIBUTES and self.__dict__.get(name) != value:
+			self.spritesDrop()
+		GUIClickableElement.__setattr__(self, name, value)
+
+	# (internal use) drop cached state sprites, giving them back to the surface pool
+	def spritesDrop(self):
+		sprites = self.__dict__.get('sprites')
+		self.__dict__['sprites'] = {}
+		if sprites:
+			for sprite in sprites.values():
+				SurfaceRelease(sprite)
+
+	# get bytes held by cached state sprites
+	def CacheBytes(self):
+		return sum([surfaceBytes(sprite) for sprite in self.sprites.values()])
+
+	# drop cached state sprites
+	def CacheDrop(self):
+		self.spritesDrop()
+
+	# get current visual state of the button
+	def StateGet(self):
 		if self.Enabled == True:
-			if self.Clicked == True:
-                                self.bordercolor = self.ColorBorderClick
-                                self.bodycolor = self.ColorBodyClick
-                                self.textcolor = self.ColorTextClick
+			if self.Clicked == True or self.Pending == True:
+				return self.BUTTONSTATE_CLICKED
+			elif self.Active == True:
+				return self.BUTTONSTATE_ACTIVE
 			else:
-	                	if self.Active == True:
-	                                self.bordercolor = self.ColorBorderActive
-        	                        self.bodycolor = self.ColorBodyActive
-                	                self.textcolor = self.ColorTextActive
-				else:
-	                        	self.bordercolor = self.ColorBorderInactive
-	                        	self.bodycolor = self.ColorBodyInactive
-	                        	self.textcolor = self.ColorTextInactive
+				return self.BUTTONSTATE_INACTIVE
+		else:
+			return self.BUTTONSTATE_DISABLED
+
+	# (internal use) draw the button in the given state onto a new sprite surface
+	def spriteRender(self, state):
+
+                # determine color scheme according to button state
+		if state == self.BUTTONSTATE_CLICKED:
+			self.bordercolor = self.ColorBorderClick
+			self.bodycolor = self.ColorBodyClick
+			self.textcolor = self.ColorTextClick
+		elif state == self.BUTTONSTATE_ACTIVE:
+			self.bordercolor = self.ColorBorderActive
+			self.bodycolor = self.ColorBodyActive
+			self.textcolor = self.ColorTextActive
+		elif state == self.BUTTONSTATE_INACTIVE:
+			self.bordercolor = self.ColorBorderInactive
+			self.bodycolor = self.ColorBodyInactive
+			self.textcolor = self.ColorTextInactive
 		else:
 			self.bordercolor = self.ColorBorderDisabled
 			self.bodycolor = self.ColorBodyDisabled
 			self.textcolor = self.ColorTextDisabled
 
+		# draw border and body
+		sprite = SurfaceCreate((self.SizeX, self.SizeY), False)
+		pygame.draw.rect(sprite, self.bordercolor, (0, 0, self.SizeX, self.SizeY))
+		pygame.draw.rect(sprite, self.bodycolor, (1, 1, self.SizeX-2, self.SizeY-2))
+		# draw button text
+		self.fontObject = fontcache.Fonts.Get(self.FontPath, self.FontSize, self.FontStyle)
+		if "\n" in self.Text:
+			# multiline text, use word wrapped drawing method
+			self.textrectangle = pygame.Rect((1, 1, self.SizeX - 2, self.SizeY - 2))
+			self.textSurface = textrect.render_textrect(self.Text, self.fontObject, self.textrectangle, self.textcolor, self.bodycolor, 1)
+			sprite.blit(self.textSurface, self.textrectangle)
+		else:
+			# single line text, use standard drawing method
+			self.textSurface = self.fontObject.render(self.Text, True, self.textcolor, self.bodycolor)
+			self.textrectangle = self.textSurface.get_rect()
+			self.textrectangle.center = ((self.SizeX / 2), (self.SizeY / 2))
+			sprite.blit(self.textSurface, self.textrectangle)
+		return sprite
+
+        # render method draws the button to the display
+        def Render(self):
+
                 # draw button
 		if self.Visible == True:
-			# draw border and body if visible
-	                pygame.draw.rect(self.Surface, self.bordercolor,(self.PosX, self.PosY, self.SizeX, self.SizeY))
-        	        pygame.draw.rect(self.Surface, self.bodycolor,(self.PosX+1, self.PosY+1, self.SizeX-2, self.SizeY-2))
-	                # draw button text
-	                self.fontObject = pygame.font.Font(self.FontPath, self.FontSize)
-	                if "\n" in self.Text:
-	                        # multiline text, use word wrapped drawing method
-	                        self.textrectangle = pygame.Rect((self.PosX + 1, self.PosY + 1, self.SizeX - 2, self.SizeY - 2))
-				try:
-		                        self.textSurface = textrect.render_textrect(self.Text, self.fontObject, self.textrectangle, self.textcolor, self.bodycolor, 1)
-				except:
-					raise
-	                        self.Surface.blit(self.textSurface, self.textrectangle)
-	                else:
-	                        # single line text, use standard drawing method
-	                        self.textSurface = self.fontObject.render(self.Text, True, self.textcolor)
-	                        self.textrectangle = self.textSurface.get_rect()
-	                        self.textrectangle.center = ((self.PosX + self.SizeX / 2), (self.PosY + self.SizeY / 2))
-	                        self.Surface.blit(self.textSurface, self.textrectangle)
+			# blit sprite for the current state, drawing it on first use
+			state = self.StateGet()
+			sprite = self.sprites.get(state)
+			if sprite == None:
+				sprite = self.spriteRender(state)
+				self.sprites[state] = sprite
+			self.BackgroundCapture()
+			self.Surface.blit(sprite, (self.PosX, self.PosY))
 		else:
-			# draw background color rectangle if invisible
-			pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY))
+			# restore background if invisible (draw background color rectangle without background buffering)
+			if self.BackgroundRestore() == False:
+				pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY))
 
+		# report the touched region
+		return self.DirtyRectAdd(pygame.Rect(self.PosX, self.PosY, self.SizeX, self.SizeY))
 
 
-	# flash Button on click and invoke OnClick handler
+	# flash Button on click and invoke OnClick handler (clicks are ignored while a handler task is pending)
 	def click(self):
-		if self.Enabled == True:
-			# render button as clicked
-			self.Clicked = True
-	                self.Render()
-			# force screen update
-	                pygame.display.update()
-			# invoke OnClick handler if applicable
-			if self.OnClick != None:
-				self.OnClick()
-			# setup button appearance reset timer
-			threading.Timer(1, self.click_reset())
+		if self.Enabled == True and self.Pending == False:
+			# render button as clicked together with the changes made by the handler (one present)
+			page = self.Page
+			if page != None:
+				page.BeginUpdate()
+			try:
+				self.Clicked = True
+				self.Invalidate()
+				# invoke OnClick handler if applicable
+				if self.OnClick != None:
+					self.handlerInvoke(self.OnClick)
+			finally:
+				if page != None:
+					page.EndUpdate()
+			# setup button appearance reset timer (serviced by the GUI thread)
+			gui = self.GUIGet()
+			if self.clickResetTimer != None:
+				self.clickResetTimer.Cancel()
+			if gui != None:
+				self.clickResetTimer = gui.Schedule(self.ClickFlashTime, self.click_reset)
+			else:
+				self.click_reset()
 			# do pygame events
 			pygame.event.pump()
 
 	# reset Button appearance after click
 	def click_reset(self):
-		# hold
-		time.sleep(0.1)
+		self.clickResetTimer = None
 		# reset appearance and render
 		self.Clicked = False
-		self.Render()
+		gui = self.GUIGet()
+		if gui == None or gui.Profiler == None:
+			self.Render()
+		else:
+			gui.Profiler.ElementRender(self)
 		# force screen update
-		pygame.display.update()
-		# do pygame events
-		pygame.event.pump()
+		self.DisplayUpdate()
 
 # Text Box Element
 class GUITextBox(GUIClickableElement):
@@ -210,6 +434,9 @@ class GUITextBox(GUIClickableElement):
                 self.ColorBackground = self.COLOR_BKGRND
                 self.FontPath = self.FONT_REGULAR_PATH
                 self.FontSize = self.FONT_REGULAR_SIZE
+		self.FontStyle = fontcache.FONTSTYLE_NORMAL
+		# compose text from the shared glyph atlas (for frequently changing readouts)
+		self.GlyphAtlas = False
 
 
         # render method draws the text box to the display
@@ -217,7 +444,7 @@ class GUITextBox(GUIClickableElement):
 
                 # determine color scheme according to textbox status
                 if self.Enabled == True:
-                        if self.Clicked == True:
+                        if self.Clicked == True or self.Pending == True:
                                 self.bordercolor = self.ColorBorderClick
                                 self.textcolor = self.ColorTextClick
                         else:
@@ -229,6 +456,8 @@ class GUITextBox(GUIClickableElement):
 
                 # draw textbox if visible
                 if self.Visible == True:
+			# save background
+			self.BackgroundCapture()
 			# textbox border set to visible?
 			if self.BorderVisible == True:
 	                        # yes, draw border and background
@@ -238,15 +467,84 @@ class GUITextBox(GUIClickableElement):
 				# no, draw only background
 				pygame.draw.rect(self.Surface, self.ColorBackground,(self.PosX, self.PosY, self.SizeX, self.SizeY))
                         # draw button text
-                        self.fontObject = pygame.font.Font(self.FontPath, self.FontSize)
+                        self.fontObject = fontcache.Fonts.Get(self.FontPath, self.FontSize, self.FontStyle)
                         # multiline text, use word wrapped drawing method
                         self.textrectangle = pygame.Rect((self.PosX + 1, self.PosY + 1, self.SizeX - 2, self.SizeY - 2))
-                        self.textSurface = textrect.render_textrect(self.Text, self.fontObject, self.textrectangle, self.textcolor, self.ColorBackground, self.TextAlignHorizontal)
-                        self.Surface.blit(self.textSurface, self.textrectangle)
+			if self.GlyphAtlas == True:
+				# compose from the glyph atlas in place, changing text does not go through the text surface cache
+				textrect.draw_textrect(self.Surface, self.Text, self.fontObject, self.textrectangle, self.textcolor, self.ColorBackground, self.TextAlignHorizontal, True)
+			else:
+	                        self.textSurface = textrect.render_textrect(self.Text, self.fontObject, self.textrectangle, self.textcolor, self.ColorBackground, self.TextAlignHorizontal)
+	                        self.Surface.blit(self.textSurface, self.textrectangle)
                 else:
-                        # draw background color rectangle if invisible
-			# TODO: implement background buffering/redrawing
-                        pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY))
+                        # restore background if invisible (draw background color rectangle without background buffering)
+			if self.BackgroundRestore() == False:
+				pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY))
+
+		# report the touched region
+		return self.DirtyRectAdd(pygame.Rect(self.PosX, self.PosY, self.SizeX, self.SizeY))
+
+
+# GUI live value label class, derives from GUITextBox
+# shows raw values through a formatter, re-rendering only when the formatted text changes and at most MaxRate times per second
+class GUIValueLabel(GUITextBox):
+
+	# default maximum refreshes per second
+	MAXRATE_DEFAULT = 10
+
+	# constructor, formatter is a callable or a format string (value % formatter), returns created object
+	def __init__(self, elementName, posX, posY, sizeX, sizeY, formatter = str, maxRate = MAXRATE_DEFAULT):
+		GUITextBox.__init__(self, elementName, posX, posY, sizeX, sizeY, '', None)
+		self.Formatter = formatter
+		self.MaxRate = maxRate
+		self.Value = None
+		# values are composed from the glyph atlas in place, outside the text surface cache
+		self.GlyphAtlas = True
+		self.valueText = ''		# formatted text of the latest value
+		self.refreshPending = False
+		self.refreshTime = 0
+		self.valueLock = threading.Lock()
+
+	# (internal use) format a raw value for display
+	def format(self, value):
+		if isinstance(self.Formatter, basestring):
+			return self.Formatter % value
+		return self.Formatter(value)
+
+	# set value to display (thread safe), the latest value is always shown eventually
+	def ValueSet(self, value):
+		text = self.format(value)
+		with self.valueLock:
+			self.Value = value
+			if text == self.valueText:
+				return
+			self.valueText = text
+			if self.refreshPending == True:
+				# refresh already requested, will pick up the latest text
+				return
+			self.refreshPending = True
+			delay = 0
+			if self.MaxRate:
+				delay = self.refreshTime + 1.0 / self.MaxRate - time.time()
+		gui = self.GUIGet()
+		if gui == None:
+			self.valueRefresh()
+		elif delay > 0:
+			gui.Schedule(delay, self.valueRefresh)
+		else:
+			gui.Post(self.valueRefresh)
+
+	# (internal use) show the latest formatted value, on the GUI thread
+	def valueRefresh(self):
+		with self.valueLock:
+			text = self.valueText
+			self.refreshPending = False
+			self.refreshTime = time.time()
+		if text != self.Text:
+			self.Text = text
+			# hidden labels only keep the text, it is shown when the label is rendered visible again
+			if self.Surface != None and self.Visible == True:
+				self.Render()
 
 
 
@@ -274,46 +572,494 @@ class GUIRectangle(GUIElement):
 			else:
 				self.rectcolor = self.ColorBorderDisabled
 			# draw rectangle in foreground color
+			self.BackgroundCapture()
+			pygame.draw.rect(self.Surface, self.rectcolor, (self.PosX, self.PosY, self.SizeX, self.SizeY), 1)
+		else:
+			# invisible, restore background (or draw rectangle in background color without background buffering)
+			if self.BackgroundRestore() == False:
+				pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY), 1)
+		# report the touched region
+		return self.DirtyRectAdd(pygame.Rect(self.PosX, self.PosY, self.SizeX, self.SizeY))
+
+
+# GUI timer, created by GUI.Schedule() and serviced by the GUI thread
+class GUITimer:
+
+	# constructor
+	def __init__(self, callback, deadline, interval):
+		self.Callback = callback
+		self.Deadline = deadline
+		self.Interval = interval
+		self.Cancelled = False
+
+	# cancel timer, the callback will not be invoked (again)
+	def Cancel(self):
+		self.Cancelled = True
+
+
+# GUI task, runs a generator (e.g. returned by a handler) step by step on the GUI thread, see GUI.TaskStart
+# the generator yields None (continue next frame), a delay in seconds or a GUITask to wait for (e.g. from GUI.Background);
+# the awaited task's result is sent back into the generator, its error is raised there
+# a generator finishes with a result by raising StopIteration(result)
+class GUITask:
+
+	# constructor
+	def __init__(self, gui, generator = None):
+		self.GUI = gui
+		self.Done = False
+		self.Cancelled = False
+		self.Result = None
+		self.Error = None		# (type, value, traceback) if the task failed
+		self.generator = generator
+		self.doneCallbacks = []
+		self.lock = threading.Lock()
+
+	# cancel task, the generator is closed at the yield it is waiting on (thread safe)
+	def Cancel(self):
+		if self.Done == False:
+			self.Cancelled = True
+			self.GUI.Post(self.cancelRun)
+
+	# call callback(task) on the GUI thread once the task is done (thread safe)
+	def DoneCallbackAdd(self, callback):
+		with self.lock:
+			if self.Done == False:
+				self.doneCallbacks.append(callback)
+				return
+		self.GUI.Post(functools.partial(callback, self))
+
+	# (internal use) finish task with result or error (thread safe)
+	def finish(self, result, error):
+		with self.lock:
+			if self.Done == True:
+				return
+			self.Result = result
+			self.Error = error
+			self.Done = True
+			callbacks = self.doneCallbacks
+			self.doneCallbacks = []
+		for callback in callbacks:
+			self.GUI.Post(functools.partial(callback, self))
+
+	# (internal use) close the generator of a cancelled task
+	def cancelRun(self):
+		if self.Done == False:
+			if self.generator != None:
+				self.generator.close()
+			self.finish(None, None)
+
+	# (internal use) resume the generator with the awaited value or error, until its next yield
+	def step(self, value = None, error = None):
+		if self.Done == True:
+			return
+		try:
+			if error != None:
+				awaited = self.generator.throw(*error)
+			else:
+				awaited = self.generator.send(value)
+		except StopIteration as e:
+			if len(e.args) > 0:
+				self.finish(e.args[0], None)
+			else:
+				self.finish(None, None)
+			return
+		except Exception as e:
+			# task failed, the GUI keeps running
+			print ("Exception in task: " + str(e))
+			print (traceback.format_exc())
+			self.finish(None, sys.exc_info())
+			return
+		if awaited == None:
+			self.GUI.Post(self.step)
+		elif isinstance(awaited, GUITask):
+			awaited.DoneCallbackAdd(self.awaitedDone)
+		elif isinstance(awaited, (int, long, float)):
+			self.GUI.Schedule(awaited, self.step)
 		else:
-			# invisible, use background color
-			self.rectcolor = self.BackgroundColor
-		# draw rectangle
-		pygame.draw.rect(self.Surface, self.rectcolor, ((self.PosX, self.PosY, self.PosX + self.SizeX, self.PosY + self.SizeY)), 1)
+			error = TypeError("Task yielded unsupported value: " + repr(awaited))
+			self.GUI.Post(functools.partial(self.step, None, (TypeError, error, None)))
+
+	# (internal use) awaited task is done, resume with its result
+	def awaitedDone(self, task):
+		self.step(task.Result, task.Error)
+
+
+# GUI profiler, collects frame, element and latency statistics (see GUI.ProfilingEnable)
+class GUIProfiler:
+
+	# frame processing phases
+	PHASES = ('events', 'handlers', 'render', 'present')
+
+	# input-to-present latency histogram bucket upper bounds (milliseconds)
+	LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+	# event types counted as input for latency measurement
+	INPUT_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.KEYDOWN)
+
+	# constructor, frameBudget and logInterval in seconds (logInterval None: no log lines)
+	def __init__(self, frameBudget, logInterval):
+		self.FrameBudget = frameBudget
+		self.LogInterval = logInterval
+		self.lock = threading.Lock()
+		self.frameStart = None
+		self.Reset()
+
+	# clear all statistics
+	def Reset(self):
+		with self.lock:
+			self.frames = 0
+			self.frameTimeTotal = 0.0
+			self.frameTimeMax = 0.0
+			self.framesOverBudget = 0
+			self.phaseTotals = dict.fromkeys(self.PHASES, 0.0)
+			self.eventsTotal = 0
+			self.eventQueueMax = 0
+			self.elements = {}		# (page name, element name) -> [count, total time, max time]
+			self.pageRenders = [0, 0.0, 0.0]
+			self.latencyHistogram = [0] * (len(self.LATENCY_BUCKETS) + 1)
+			self.latencyCount = 0
+			self.latencyTotal = 0.0
+			self.latencyMax = 0.0
+			self.inputPending = []
+			self.logTime = time.time()
+			self.logFrames = 0
+			self.logFrameMax = 0.0
+			self.logOverBudget = 0
+
+	# (GUI thread) frame processing starts with the fetched events
+	def FrameBegin(self, events):
+		now = time.time()
+		self.frameStart = now
+		self.phaseMark = now
+		self.framePhases = dict.fromkeys(self.PHASES, 0.0)
+		self.frameEvents = len(events)
+		self.frameWork = len(events) > 0
+		with self.lock:
+			for event in events:
+				if event.type in self.INPUT_EVENTS:
+					self.inputPending.append(now)
+
+	# (GUI thread) account time since the previous mark to a frame phase
+	def Mark(self, phase):
+		if self.frameStart != None:
+			now = time.time()
+			self.framePhases[phase] = self.framePhases[phase] + now - self.phaseMark
+			self.phaseMark = now
+
+	# (GUI thread) frame processing ends
+	def FrameEnd(self):
+		if self.frameStart == None:
+			return
+		now = time.time()
+		frameTime = now - self.frameStart
+		self.frameStart = None
+		if self.frameWork == False:
+			# idle wakeup, not a frame
+			return
+		with self.lock:
+			self.frames = self.frames + 1
+			self.frameTimeTotal = self.frameTimeTotal + frameTime
+			self.frameTimeMax = max(self.frameTimeMax, frameTime)
+			for phase in self.PHASES:
+				self.phaseTotals[phase] = self.phaseTotals[phase] + self.framePhases[phase]
+			self.eventsTotal = self.eventsTotal + self.frameEvents
+			self.eventQueueMax = max(self.eventQueueMax, self.frameEvents)
+			self.logFrames = self.logFrames + 1
+			self.logFrameMax = max(self.logFrameMax, frameTime)
+			if frameTime > self.FrameBudget:
+				self.framesOverBudget = self.framesOverBudget + 1
+				self.logOverBudget = self.logOverBudget + 1
+		# periodic log line
+		if self.LogInterval != None and now - self.logTime >= self.LogInterval:
+			self.logWrite(now)
+
+	# (internal use) print statistics of the last log interval
+	def logWrite(self, now):
+		with self.lock:
+			line = "GUI stats: %d frames in %.1f s, max frame %.1f ms" % (self.logFrames, now - self.logTime, self.logFrameMax * 1000.0)
+			if self.logOverBudget > 0:
+				line = line + ", %d frames OVER BUDGET (%.1f ms)" % (self.logOverBudget, self.FrameBudget * 1000.0)
+			self.logTime = now
+			self.logFrames = 0
+			self.logFrameMax = 0.0
+			self.logOverBudget = 0
+		print (line)
+
+	# render element and account its render time
+	def ElementRender(self, element):
+		start = time.time()
+		result = element.Render()
+		elapsed = time.time() - start
+		self.frameWork = True
+		page = element.Page
+		key = (page.Name if page != None else None, element.Name)
+		with self.lock:
+			entry = self.elements.get(key)
+			if entry == None:
+				entry = self.elements[key] = [0, 0.0, 0.0]
+			entry[0] = entry[0] + 1
+			entry[1] = entry[1] + elapsed
+			entry[2] = max(entry[2], elapsed)
+		return result
+
+	# account a full page render
+	def PageRendered(self, elapsed):
+		with self.lock:
+			self.pageRenders[0] = self.pageRenders[0] + 1
+			self.pageRenders[1] = self.pageRenders[1] + elapsed
+			self.pageRenders[2] = max(self.pageRenders[2], elapsed)
+
+	# display regions were presented, completes latency measurement of pending input
+	def Presented(self):
+		now = time.time()
+		self.frameWork = True
+		with self.lock:
+			for inputTime in self.inputPending:
+				latency = (now - inputTime) * 1000.0
+				self.latencyHistogram[bisect.bisect_left(self.LATENCY_BUCKETS, latency)] += 1
+				self.latencyCount = self.latencyCount + 1
+				self.latencyTotal = self.latencyTotal + latency
+				self.latencyMax = max(self.latencyMax, latency)
+			self.inputPending = []
+
+	# get statistics snapshot (times in milliseconds)
+	def Snapshot(self):
+		with self.lock:
+			frames = max(self.frames, 1)
+			phases = {}
+			for phase in self.PHASES:
+				phases[phase] = {'total_ms': self.phaseTotals[phase] * 1000.0, 'mean_ms': self.phaseTotals[phase] * 1000.0 / frames}
+			elements = {}
+			for (pageName, elementName), (count, total, maximum) in self.elements.items():
+				elements[str(pageName) + '.' + str(elementName)] = {'count': count, 'total_ms': total * 1000.0, 'mean_ms': total * 1000.0 / count, 'max_ms': maximum * 1000.0}
+			bounds = [str(bound) for bound in self.LATENCY_BUCKETS] + ['inf']
+			return {
+				'frames': self.frames,
+				'frameTime': {'mean_ms': self.frameTimeTotal * 1000.0 / frames, 'max_ms': self.frameTimeMax * 1000.0},
+				'frameBudget_ms': self.FrameBudget * 1000.0,
+				'framesOverBudget': self.framesOverBudget,
+				'phases': phases,
+				'eventQueueDepth': {'mean': float(self.eventsTotal) / frames, 'max': self.eventQueueMax},
+				'elements': elements,
+				'pageRenders': {'count': self.pageRenders[0], 'total_ms': self.pageRenders[1] * 1000.0, 'max_ms': self.pageRenders[2] * 1000.0},
+				'inputLatency': {
+					'count': self.latencyCount,
+					'mean_ms': self.latencyTotal / max(self.latencyCount, 1),
+					'max_ms': self.latencyMax,
+					'histogram_ms': zip(bounds, self.latencyHistogram)}}
+
+
+# SDL display backend (default), presents through pygame.display (see fbdisplay.FramebufferDisplay for an alternative)
+class GUIDisplay:
+
+	# open display, returns the surface to render to (depth 0: native depth)
+	def Open(self, size, depth = 0):
+		return pygame.display.set_mode(size, pygame.FULLSCREEN | pygame.DOUBLEBUF, depth)
+
+	# present changed regions
+	def Update(self, rects):
+		pygame.display.update(rects)
+
+	# close display
+	def Close(self):
+		pass
 
 
 # GUI handling class
 class GUI:
 
+	# GUI loop modes
+	LOOPMODE_POLL = 0		# poll for pending events TargetFPS times per second
+	LOOPMODE_EVENT = 1		# block until input arrives or the GUI is woken up
+
+	# pygame event type used to wake up the GUI thread
+	EVENT_WAKEUP = pygame.USEREVENT
+
+	# default framebuffer device
+	FRAMEBUFFER_DEVICE = '/dev/fb1'
+
+	# default display size (pixels) and depth (bits per pixel, 0: native depth)
+	DISPLAY_SIZE = (800, 480)
+	DISPLAY_DEPTH = 0
+
+	# default frame rates (frames per second)
+	TARGET_FPS = 20			# GUI loop rate in poll mode
+	MAX_FPS = 60			# upper limit for display presents (None: unlimited)
+
+	# pygame event types handled by the input stage
+	INPUT_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.KEYDOWN)
+
+	# default touch input timing (seconds)
+	DEBOUNCE_TIME = 0.04		# a press this soon after a release continues the touch (contact bounce)
+	INPUT_BUDGET = 0.02		# input processing time per frame, remaining events wait for the next frame
+
 	# add a GUI page object to the GUI system
         def AddPage(self, guiPage):
-		# give the new page a dummy surface
-		guiPage.RenderingSurfaceSet(pygame.Surface((800, 480)))
+		guiPage.GUI = self
                 self.Pages.append(guiPage)
-		guiPage.Initialize()
+		self.pagesByName.setdefault(guiPage.Name, len(self.Pages) - 1)
+		# initialize now, or when the page is shown first
+		if self.LazyPageInit == False:
+			self.PageLoad(guiPage)
                 return guiPage
 
+	# initialize page if not done yet (thread safe)
+	def PageLoad(self, guiPage):
+		with self.pageLock:
+			if guiPage.IsInitialized == False:
+				# elements are set up on the scratch surface (contents are discarded)
+				guiPage.RenderingSurfaceSet(self.scratchSurfaceGet())
+				guiPage.IsInitialized = True
+				guiPage.Initialize()
+
+	# load pages in the background (GUI thread, when idle) and render them to their backbuffers, for instant Show
+	def PagePrewarm(self, guiPage):
+		with self.pageLock:
+			if guiPage not in self.prewarmQueue:
+				self.prewarmQueue.append(guiPage)
+		self.Wake()
+
+	# (internal use) prewarm the next queued page
+	def prewarmStep(self):
+		with self.pageLock:
+			if len(self.prewarmQueue) == 0:
+				return
+			guiPage = self.prewarmQueue.popleft()
+			if guiPage.IsActive == True:
+				return
+			self.PageLoad(guiPage)
+			if guiPage.RetainBackbuffer == True and guiPage.BackbufferValid == False:
+				backbuffer = self.offscreenSurfaceGet(guiPage)
+				# clear like ClearScreen does before a page is rendered on display
+				backbuffer.fill((0,0,0))
+				guiPage.RenderingSurfaceSet(backbuffer)
+				guiPage.Render()
+				guiPage.BackbufferValid = True
+			self.pageUsed(guiPage)
+			self.pagesEvict()
+
+	# (internal use) mark page as most recently used
+	def pageUsed(self, guiPage):
+		self.pageUsage.pop(id(guiPage), None)
+		self.pageUsage[id(guiPage)] = guiPage
+
+	# (internal use) unload least recently used hidden pages while page memory exceeds PageMemoryLimit
+	def pagesEvict(self):
+		if self.PageMemoryLimit == None:
+			return
+		memoryUsage = sum([guiPage.MemoryUsage() for guiPage in self.pageUsage.values()])
+		for guiPage in self.pageUsage.values():
+			if memoryUsage <= self.PageMemoryLimit:
+				break
+			if guiPage.IsActive == False:
+				memoryUsage = memoryUsage - guiPage.MemoryUsage()
+				guiPage.Unload()
+				del self.pageUsage[id(guiPage)]
+
+	# (internal use) get surface for a hidden page to render to: its retained backbuffer, or a shared scratch surface
+	def offscreenSurfaceGet(self, guiPage):
+		if guiPage.RetainBackbuffer == True:
+			if guiPage.Backbuffer == None:
+				guiPage.Backbuffer = SurfaceCreate(self.Surface.get_size())
+			return guiPage.Backbuffer
+		# not retained, drop backbuffer and render to scratch surface (contents are discarded)
+		if guiPage.Backbuffer != None:
+			SurfaceRelease(guiPage.Backbuffer)
+			guiPage.Backbuffer = None
+		guiPage.BackbufferValid = False
+		return self.scratchSurfaceGet()
+
+	# (internal use) get shared scratch surface for hidden pages without backbuffer
+	def scratchSurfaceGet(self):
+		if self.scratchSurface == None:
+			self.scratchSurface = SurfaceCreate(self.Surface.get_size())
+		return self.scratchSurface
+
 	# clear the screen (fill surface with black)
         def ClearScreen(self):
                 self.Surface.fill((0,0,0))
+		self.DirtyRectAdd(self.Surface.get_rect())
 
-        def __init__(self):
+	# constructor, videoDriver selects the SDL video driver (None: SDL default, 'dummy' for headless use)
+	# display selects the display backend (None: GUIDisplay, presenting through SDL)
+        def __init__(self, loopMode = LOOPMODE_POLL, videoDriver = None, framebufferDevice = FRAMEBUFFER_DEVICE, display = None, displaySize = DISPLAY_SIZE, displayDepth = DISPLAY_DEPTH):
                 # GUI Pages list and active reference
                 self.Pages = []
                 self.CurrentPageIndex = None
-		self.LockUpdate = False
+		self.pagesByName = {}		# page name -> page index
+		self.GuiThread = None
+		self.scratchSurface = None
+		self.Profiler = None
+
+		# screenshots and recordings are written by a background worker, Recorder keeps recent frames (see RecordingStart)
+		self.Capture = screencapture.CaptureWorker()
+		self.Recorder = None
+
+		# page loading: lazy initialization, memory cap (bytes, None: unlimited) and prewarming
+		self.LazyPageInit = True
+		self.PageMemoryLimit = None
+		self.pageUsage = collections.OrderedDict()	# id(page) -> loaded page, least recently used first
+		self.prewarmQueue = collections.deque()
+		self.pageLock = threading.RLock()
+
+		# GUI loop mode and timing (seconds)
+		self.LoopMode = loopMode
+		self.IdleTimeout = 1.0
+		self.wakeupPending = False
+
+		# frame pacing, changed regions are presented at most MaxFPS times per second
+		self.TargetFPS = self.TARGET_FPS
+		self.PollInterval = None	# (deprecated, use TargetFPS) poll mode loop interval in seconds, overrides TargetFPS if set
+		self.MaxFPS = self.MAX_FPS
+		self.lastPresent = 0
+		self.updateLevel = 0		# BeginUpdate nesting level, presents are held while > 0
+		self.LockUpdate = False		# (deprecated, use BeginUpdate/EndUpdate)
+
+		# touch input stage (GUI thread only)
+		self.DebounceTime = self.DEBOUNCE_TIME
+		self.InputBudget = self.INPUT_BUDGET
+		self.inputQueue = collections.deque()
+		self.touchDown = False
+		self.touchElement = None	# element the touch was pressed on
+		self.touchRelease = None	# (time, position) of a release held back for debouncing
+		self.clickpos = None
+
+		# timer heap of (deadline, sequence, GUITimer) entries
+		self.timers = []
+		self.timerSequence = itertools.count()
+		self.timerLock = threading.Lock()
+
+		# work queued for the GUI thread: posted callables and invalidated elements (id -> element)
+		self.postedCalls = collections.deque()
+		self.invalidElements = collections.OrderedDict()
+		self.queueLock = threading.Lock()
+
+		# display regions changed since the last update (non-overlapping)
+		self.DirtyRects = []
+		self.dirtyLock = threading.Lock()
 
                 # initialize pygame
-                os.putenv('SDL_FBDEV', '/dev/fb1')	# framebuffer device
+		if framebufferDevice != None:
+			os.putenv('SDL_FBDEV', framebufferDevice)	# framebuffer device
+		if videoDriver != None:
+			os.putenv('SDL_VIDEODRIVER', videoDriver)	# video driver
                 pygame.init()
 
                 # hide mouse pointer (make it fully transparent, because the obvious set_visible(False) locks the mouse at center screen)
 		pygame.mouse.set_cursor((8,8),(0,0),(0,0,0,0,0,0,0,0),(0,0,0,0,0,0,0,0))
 
                 # setup display and obtain rendering surface
-                self.Surface = pygame.display.set_mode((800, 480), pygame.FULLSCREEN | pygame.DOUBLEBUF)
+		if display == None:
+			display = GUIDisplay()
+		self.Display = display
+                self.Surface = self.Display.Open(displaySize, displayDepth)
                 self.ClearScreen()
 
 		# setup and start GUI thread
+		self.loopStart()
+
+	# (internal use) start the GUI thread running the GUI loop
+	def loopStart(self):
 		self.GuiThread = threading.Thread(target=self.guiLoop, args=(self,))
 		#self.GuiThread.daemon = True
 		self.IsRunning = True		
@@ -325,7 +1071,13 @@ class GUI:
                 if self.CurrentPageIndex != None:
                         try:
 				# try rendering
-				self.Pages[self.CurrentPageIndex].Render()
+				profiler = self.Profiler
+				if profiler == None:
+					self.Pages[self.CurrentPageIndex].Render()
+				else:
+					start = time.time()
+					self.Pages[self.CurrentPageIndex].Render()
+					profiler.PageRendered(time.time() - start)
 	                	#pygame.display.update()
 			except Exception as e:
 				# caught exception
@@ -334,55 +1086,216 @@ class GUI:
            		        print ("Shutting down GUI...")
 	                        self.IsRunning = False
 
-	# Update the graphical display
+	# mark a display region as changed, merging it with overlapping dirty regions
+	def DirtyRectAdd(self, rect):
+		rect = pygame.Rect(rect).clip(self.Surface.get_rect())
+		if rect.width > 0 and rect.height > 0:
+			with self.dirtyLock:
+				index = rect.collidelist(self.DirtyRects)
+				while index != -1:
+					rect.union_ip(self.DirtyRects.pop(index))
+					index = rect.collidelist(self.DirtyRects)
+				self.DirtyRects.append(rect)
+			# make the GUI thread present the change if rendered from elsewhere
+			if threading.current_thread() is not self.GuiThread:
+				self.Wake()
+
+	# wake up the GUI thread (thread safe, no effect in poll mode)
+	def Wake(self):
+		if self.LoopMode == self.LOOPMODE_EVENT and self.wakeupPending == False:
+			self.wakeupPending = True
+			try:
+				pygame.event.post(pygame.event.Event(self.EVENT_WAKEUP))
+			except pygame.error:
+				# event queue full, GUI thread is going to wake up anyway
+				pass
+
+	# request an update of the graphical display (thread safe)
+	# the GUI thread presents the changed regions once per frame, requests made meanwhile are collapsed
 	def Update(self):
-		pygame.display.update()
+		if threading.current_thread() is not self.GuiThread:
+			self.Wake()
+
+	# hold display updates until the matching EndUpdate (thread safe, may be nested)
+	def BeginUpdate(self):
+		with self.dirtyLock:
+			self.updateLevel = self.updateLevel + 1
+
+	# release display updates held by BeginUpdate, changes are presented with the next frame
+	def EndUpdate(self):
+		with self.dirtyLock:
+			self.updateLevel = max(self.updateLevel - 1, 0)
+			released = self.updateLevel == 0
+		if released == True:
+			self.Update()
+
+	# update batch over all pages as context manager: with gui.Batch(): ...
+	# element changes only mark elements dirty, at the end each is rendered once and the display is presented once
+	@contextlib.contextmanager
+	def Batch(self):
+		with self.pageLock:
+			pages = list(self.Pages)
+		self.BeginUpdate()
+		for guiPage in pages:
+			guiPage.BeginUpdate()
+		try:
+			yield self
+		finally:
+			try:
+				for guiPage in pages:
+					guiPage.EndUpdate()
+			finally:
+				self.EndUpdate()
+
+	# (internal use) get seconds per GUI loop iteration in poll mode
+	def frameInterval(self):
+		if self.PollInterval != None:
+			return self.PollInterval
+		return 1.0 / self.TargetFPS
+
+	# (internal use) get seconds until the next present is allowed by MaxFPS
+	def presentDelay(self):
+		if not self.MaxFPS:
+			return 0
+		return max(0, self.lastPresent + 1.0 / self.MaxFPS - time.time())
+
+	# (internal use) present changed display regions if any and a present is due, returns the presented regions
+	def present(self):
+		with self.dirtyLock:
+			if len(self.DirtyRects) == 0 or self.updateLevel > 0 or self.LockUpdate == True or self.presentDelay() > 0:
+				return []
+			rects = self.DirtyRects
+			self.DirtyRects = []
+		self.Display.Update(rects)
+		self.lastPresent = time.time()
+		recorder = self.Recorder
+		if recorder != None:
+			recorder.FrameAdd(self.Surface, rects)
+		if self.Profiler != None:
+			self.Profiler.Presented()
+		return rects
+
+	# save a screenshot to the next numbered file (or path), encoded in the background, returns the path
+	# NOTE: called from another thread than the GUI thread, the frame may be captured while it is being rendered
+	def Screenshot(self, path = None):
+		return self.Capture.Screenshot(self.Surface, path)
+
+	# start recording the last seconds of display output (memory bounded by maxBytes), restarts a running recording
+	def RecordingStart(self, seconds = screencapture.FrameRecorder.SECONDS_DEFAULT, maxBytes = screencapture.FrameRecorder.MAXBYTES_DEFAULT):
+		recorder = screencapture.FrameRecorder(seconds, maxBytes)
+		recorder.Start(self.Surface)
+		self.Recorder = recorder
+
+	# stop recording, dropping the recorded frames
+	def RecordingStop(self):
+		recorder = self.Recorder
+		self.Recorder = None
+		if recorder != None:
+			recorder.Stop()
+
+	# write the recorded frames to the next numbered directory (or directory) in the background, returns the directory (None if not recording)
+	def RecordingDump(self, directory = None):
+		recorder = self.Recorder
+		if recorder == None:
+			return None
+		# snapshot is taken under the recorder lock, it is None if the recording was stopped meanwhile
+		snapshot = recorder.Snapshot()
+		if snapshot == None:
+			return None
+		return self.Capture.RecordingWrite(snapshot, directory)
+
+	# (internal use) dump the recording after the GUI loop failed, waiting for the files to be written
+	def recordingCrashDump(self):
+		try:
+			directory = self.RecordingDump()
+			if directory != None:
+				self.Capture.Flush(10.0)
+				print ("Recording written to " + directory)
+		except Exception as e:
+			print ("Recording dump failed: " + str(e))
+
+	# enable frame profiling, frameBudget and logInterval in seconds (logInterval None: no periodic log line)
+	def ProfilingEnable(self, frameBudget = 0.05, logInterval = None):
+		self.Profiler = GUIProfiler(frameBudget, logInterval)
+
+	# disable frame profiling
+	def ProfilingDisable(self):
+		self.Profiler = None
+
+	# get statistics snapshot (profiling data only if profiling is enabled)
+	def Stats(self):
+		stats = {'fonts': fontcache.Fonts.Stats(), 'textCache': textrect.cache_stats(), 'surfacePool': surfacepool.Surfaces.Stats(), 'glyphAtlases': glyphatlas.Atlases.Stats(), 'dirtyRects': len(self.DirtyRects)}
+		stats['capture'] = self.Capture.Stats()
+		if self.Recorder != None:
+			stats['recorder'] = self.Recorder.Stats()
+		with self.pageLock:
+			stats['pages'] = {'pages': len(self.Pages), 'loaded': len(self.pageUsage), 'memory': sum([guiPage.MemoryUsage() for guiPage in self.pageUsage.values()]), 'memoryLimit': self.PageMemoryLimit}
+		profiler = self.Profiler
+		if profiler != None:
+			stats['profile'] = profiler.Snapshot()
+		return stats
 
 	def DoEvents(self):
 		pygame.event.pump()
 
 	# Get GUIPage object by Name
         def PageByName(self, pageName):
-                for page in self.Pages:
-                        if page.Name == pageName:
-                                return page
+		pageIndex = self.pagesByName.get(pageName)
+		if pageIndex != None:
+			return self.Pages[pageIndex]
 
 	# Get GUIPage index by Name
         def PageIndexByName(self, pageName):
-                self.counter = 0;
-                for page in self.Pages:
-                        if page.Name == pageName:
-                                return self.counter
-                        else:
-                                self.counter = self.counter + 1
+		return self.pagesByName.get(pageName)
 
 	# Show spcified GUI Page (make active / bring to foreground)
-        def Show(self, pageObject):
+	def Show(self, pageObject):
+		with self.pageLock:
+			self.PageLoad(pageObject)
+			self.pageShow(pageObject)
+			self.pageUsed(pageObject)
+			self.pagesEvict()
+
+	# (internal use) make page active, page lock held
+        def pageShow(self, pageObject):
 		try:
 			# set current page inactive (if we have a current page)
 	                if self.CurrentPageIndex != None:
+				currentPage = self.Pages[self.CurrentPageIndex]
 				# flag as inactive
-				self.Pages[self.CurrentPageIndex].IsActive = False
-				# substitute display surface with dummy surface
-				self.Pages[self.CurrentPageIndex].RenderingSurfaceSet(pygame.Surface((800, 640)))
-	
-			# clear the screen
-			self.ClearScreen()
+				currentPage.IsActive = False
+				# substitute display surface with offscreen surface
+				offscreenSurface = self.offscreenSurfaceGet(currentPage)
+				if currentPage.RetainBackbuffer == True:
+					# keep what is on display as the page's backbuffer
+					offscreenSurface.blit(self.Surface, (0, 0))
+					currentPage.BackbufferValid = True
+				currentPage.RenderingSurfaceSet(offscreenSurface)
 
 			# update current page index
 	                self.CurrentPageIndex = self.PageIndexByName(pageObject.Name)
+			newPage = self.Pages[self.CurrentPageIndex]
+
+			# restore retained backbuffer, or clear the screen
+			renderPage = not (newPage.BackbufferValid == True and newPage.Backbuffer != None)
+			if renderPage == False:
+				self.Surface.blit(newPage.Backbuffer, (0, 0))
+				self.DirtyRectAdd(self.Surface.get_rect())
+			else:
+				self.ClearScreen()
 
 			# give the new current page the display surface
-			self.Pages[self.CurrentPageIndex].RenderingSurfaceSet(self.Surface)
+			newPage.RenderingSurfaceSet(self.Surface)
 
 			# set new current page active
-			self.Pages[self.CurrentPageIndex].IsActive = True
+			newPage.IsActive = True
 
 			# call OnShow on the new page
-			self.Pages[self.CurrentPageIndex].OnShow()
+			newPage.OnShow()
 
-			# render the page
-	                self.Render()
+			# render the page (unless restored from backbuffer)
+			if renderPage == True:
+				self.Render()
 
 		except Exception as e:
 	                #exception occured on gui thread. print error and shut down.
@@ -395,83 +1308,701 @@ class GUI:
 	# Request GUI shutdown (exit GUI Loop thread)
 	def Shutdown(self):
 		self.IsRunning = False
+		self.Wake()
+
+	# run callback on the GUI thread after delay seconds, then every interval seconds if given (thread safe)
+	def Schedule(self, delay, callback, interval = None):
+		timer = GUITimer(callback, time.time() + delay, interval)
+		with self.timerLock:
+			heapq.heappush(self.timers, (timer.Deadline, next(self.timerSequence), timer))
+		# wake up GUI thread so it can adjust its wait timeout
+		if threading.current_thread() is not self.GuiThread:
+			self.Wake()
+		return timer
+
+	# request re-rendering of element on the GUI thread (thread safe, repeated requests are coalesced)
+	def Invalidate(self, element):
+		with self.queueLock:
+			self.invalidElements[id(element)] = element
+		if threading.current_thread() is not self.GuiThread:
+			self.Wake()
+
+	# run a generator as GUI task on the GUI thread (thread safe), returns the GUITask
+	def TaskStart(self, generator):
+		task = GUITask(self, generator)
+		if threading.current_thread() is self.GuiThread:
+			# run up to the first yield right away
+			task.step()
+		else:
+			self.Post(task.step)
+		return task
+
+	# run function(*args) on a worker thread, returns a GUITask that is done with its result
+	# (yield it from a task or return it from a handler to wait for blocking work without freezing the GUI)
+	def Background(self, function, *args):
+		task = GUITask(self)
+		def work():
+			try:
+				result = function(*args)
+			except Exception:
+				task.finish(None, sys.exc_info())
+				return
+			task.finish(result, None)
+		worker = threading.Thread(target=work)
+		worker.daemon = True
+		worker.start()
+		return task
+
+	# run callable (without arguments) on the GUI thread (thread safe)
+	def Post(self, callback):
+		with self.queueLock:
+			self.postedCalls.append(callback)
+		if threading.current_thread() is not self.GuiThread:
+			self.Wake()
+
+	# (internal use) run posted callables, then render invalidated elements (once each)
+	def queueDrain(self):
+		with self.queueLock:
+			calls = self.postedCalls
+			self.postedCalls = collections.deque()
+		for call in calls:
+			call()
+		profiler = self.Profiler
+		if profiler != None:
+			profiler.Mark('handlers')
+		with self.queueLock:
+			elements = self.invalidElements.values()
+			self.invalidElements = collections.OrderedDict()
+		for element in elements:
+			if profiler == None:
+				element.Render()
+			else:
+				profiler.ElementRender(element)
+		if profiler != None:
+			profiler.Mark('render')
+
+	# (internal use) get seconds until the next timer is due, at most maxTimeout
+	def timersTimeout(self, maxTimeout):
+		with self.timerLock:
+			if len(self.timers) == 0:
+				return maxTimeout
+			return max(0, min(maxTimeout, self.timers[0][0] - time.time()))
+
+	# (internal use) invoke callbacks of due timers
+	def timersRun(self):
+		now = time.time()
+		while True:
+			with self.timerLock:
+				if len(self.timers) == 0 or self.timers[0][0] > now:
+					break
+				deadline, sequence, timer = heapq.heappop(self.timers)
+				if timer.Cancelled == False and timer.Interval != None:
+					# reschedule repeating timer (without catching up on missed intervals)
+					timer.Deadline = max(deadline + timer.Interval, now)
+					heapq.heappush(self.timers, (timer.Deadline, next(self.timerSequence), timer))
+			if timer.Cancelled == False:
+				timer.Callback()
+
+	# (internal use) get seconds the GUI loop may wait, at most maxTimeout (until a timer, held present or input is due)
+	def loopTimeout(self, maxTimeout):
+		timeout = self.timersTimeout(maxTimeout)
+		if len(self.DirtyRects) > 0 and self.updateLevel == 0 and self.LockUpdate == False:
+			timeout = min(timeout, self.presentDelay())
+		if len(self.inputQueue) > 0 or len(self.prewarmQueue) > 0 or len(self.postedCalls) > 0:
+			# input left over from the last frame, pages to prewarm, or calls posted by the GUI thread itself
+			timeout = 0
+		elif self.touchRelease != None:
+			timeout = min(timeout, max(0, self.touchRelease[0] + self.DebounceTime - time.time()))
+		return timeout
+
+	# (internal use) queue fetched input events for processing, coalescing consecutive mouse motion
+	def inputQueueAdd(self, events):
+		for event in events:
+			if event.type not in self.INPUT_EVENTS:
+				continue
+			if event.type == pygame.MOUSEMOTION and len(self.inputQueue) > 0 and self.inputQueue[-1].type == pygame.MOUSEMOTION:
+				# only the latest position of a motion burst matters
+				self.inputQueue[-1] = event
+			else:
+				self.inputQueue.append(event)
+
+	# (internal use) process queued input events within the frame's input budget (at least one event)
+	def inputProcess(self):
+		if self.CurrentPageIndex == None:
+			# no page on display, discard input
+			self.inputQueue.clear()
+			return
+		page = self.Pages[self.CurrentPageIndex]
+		# touched element went away with its page
+		if self.touchElement != None and self.touchElement.Page is not page:
+			self.touchCancel()
+		profiler = self.Profiler
+		deadline = time.time() + self.InputBudget
+		while len(self.inputQueue) > 0:
+			event = self.inputQueue.popleft()
+			if profiler != None:
+				profiler.Mark('events')
+			if event.type == pygame.MOUSEBUTTONDOWN:
+				self.touchPress(page, event.pos)
+			elif event.type == pygame.MOUSEBUTTONUP:
+				self.touchReleaseHold(event.pos)
+			elif event.type == pygame.MOUSEMOTION:
+				self.touchMove(page, event.pos)
+			elif event.type == pygame.KEYDOWN and event.key == pygame.K_F12:
+				# save screenshot (numbered file, written in the background)
+				self.Screenshot()
+			if profiler != None:
+				profiler.Mark('handlers')
+			if time.time() >= deadline:
+				break
+		# deliver held back release once the debounce time is over
+		if self.touchRelease != None and time.time() - self.touchRelease[0] >= self.DebounceTime:
+			self.touchReleaseDeliver(page)
+
+	# (internal use) touch pressed, delivers press to the topmost element at position
+	def touchPress(self, page, position):
+		if self.touchRelease != None:
+			if time.time() - self.touchRelease[0] < self.DebounceTime:
+				# contact bounced, the touch continues
+				self.touchRelease = None
+				return
+			self.touchReleaseDeliver(page)
+		if self.touchDown == True:
+			# repeated press without release
+			return
+		self.touchDown = True
+		self.clickpos = position
+		self.touchElement = page.ElementAt(position[0], position[1])
+		if self.touchElement != None:
+			self.touchElement.press(position[0], position[1])
+
+	# (internal use) touch released, held back for the debounce time
+	def touchReleaseHold(self, position):
+		if self.touchDown == True:
+			self.touchRelease = (time.time(), position)
+
+	# (internal use) deliver release to the pressed element if still on it, cancel otherwise
+	def touchReleaseDeliver(self, page):
+		position = self.touchRelease[1]
+		self.touchRelease = None
+		self.touchDown = False
+		element = self.touchElement
+		self.touchElement = None
+		if element != None:
+			if page.ElementAt(position[0], position[1]) is element:
+				element.release(position[0], position[1])
+			else:
+				element.cancel()
+
+	# (internal use) touch moved, cancels the touch on the pressed element when moved off it
+	def touchMove(self, page, position):
+		if self.touchElement != None and page.ElementAt(position[0], position[1]) is not self.touchElement:
+			self.touchCancel()
+
+	# (internal use) cancel the touch on the pressed element (the touch itself stays down)
+	def touchCancel(self):
+		element = self.touchElement
+		self.touchElement = None
+		if element != None:
+			element.cancel()
+
+	# (internal use) wait for a pygame event for at most timeout seconds, returns None on timeout
+	def eventWait(self, timeout):
+		if pygame.version.vernum[0] >= 2:
+			event = pygame.event.wait(int(timeout * 1000))
+		else:
+			# pygame 1.x event.wait() has no timeout, have a timer post a wakeup event instead
+			pygame.time.set_timer(self.EVENT_WAKEUP, max(int(timeout * 1000), 1))
+			event = pygame.event.wait()
+			pygame.time.set_timer(self.EVENT_WAKEUP, 0)
+		if event.type == pygame.NOEVENT:
+			return None
+		return event
+
+	# (internal use) wait for and fetch pending pygame events according to loop mode
+	def eventsGet(self):
+		if self.LoopMode == self.LOOPMODE_EVENT:
+			# block until input arrives, the GUI is woken up, a timer or present is due or the idle timeout expires
+			timeout = self.loopTimeout(self.IdleTimeout)
+			event = None
+			if timeout > 0:
+				event = self.eventWait(timeout)
+			self.wakeupPending = False
+			events = pygame.event.get()
+			if event != None:
+				events.insert(0, event)
+		else:
+			# put main loop to sleep (yield processing time)
+			time.sleep(self.loopTimeout(self.frameInterval()))
+			# invoke pygame event pump
+			pygame.event.pump()
+			events = pygame.event.get()
+		return events
+
+	# (internal use) one GUI loop iteration on the fetched events
+	def frameRun(self, events):
+		profiler = self.Profiler
+		if profiler != None:
+			profiler.FrameBegin(events)
+		# process touch and key input (handlers run from here)
+		self.inputQueueAdd(events)
+		self.inputProcess()
+		if profiler != None:
+			profiler.Mark('events')
+		# run due timers
+		self.timersRun()
+		# run posted calls and render invalidated elements
+		self.queueDrain()
+		# present changes (if due)
+		self.present()
+		# prewarm a page when there is no input waiting
+		if len(self.inputQueue) == 0:
+			self.prewarmStep()
+		if profiler != None:
+			profiler.Mark('present')
+			profiler.FrameEnd()
 
 	# GUI Loop (GUI thread)
 	def guiLoop(self, dummy):
 		while self.IsRunning:
                    try:
-			# put main loop to sleep (yield processing time)
-			time.sleep(0.05)
-			# invoke pygame event pump
-			pygame.event.pump()
-			# see if GUI has a GUIPage on display
-			if self.CurrentPageIndex != None:
-			  # process mouse events
-			  for event in pygame.event.get():
-			    # see if mouse was clicked
-			    if(event.type is pygame.MOUSEBUTTONDOWN):
-				# obtain mouse position on click
-				self.clickpos = pygame.mouse.get_pos()
-				# iterate through GUI elements on current page
-	      		    	for element in self.Pages[self.CurrentPageIndex].Elements:
-				  # see if current element is clickable (has click() method)
-				  if hasattr(element, 'click'):
-  				    # hit test on this particular element
-	 			    if (self.clickpos[0] > (element.PosX + 3)) & (self.clickpos[0] < (element.PosX + element.SizeX - 3)):
-			              if (self.clickpos[1] > (element.PosY + 2)) & (self.clickpos[1] < (element.PosY + element.SizeY - 2)):
-				        # hit test succeeded, invoke click() method
-					element.click()				
-			    # see if key was pressed
-			    if(event.type is pygame.KEYDOWN):
-			      # yes, was it the F12 key?
-			      if event.key == pygame.K_F12:
-				# yes, save screenshot
-				pygame.image.save(self.Surface, 'screenshot.tga')
-		        # update gui
-			if self.LockUpdate == False:
-				pygame.display.update()
+			# wait for and fetch events (sleeps in poll mode, blocks in event mode), then process them
+			self.frameRun(self.eventsGet())
 		   except Exception as e:
 		     #exception occured on gui thread. print error and shut down.
 		     print ("Exception: " + str(e))
 		     print (traceback.format_exc())
 		     print ("Shutting down GUI...")
 		     self.IsRunning = False
+		     self.recordingCrashDump()
 		# gui thread exiting
+		self.Display.Close()
 		print ("GUI thread exiting...")
 
+
+# GUI without a thread of its own, for applications that run their own main loop (there is no asyncio in Python 2)
+# the thread creating the AsyncGUI is the GUI thread: it calls Step() whenever NextTimeout() seconds have passed
+# or OnWake was called; Loop() wraps this as a generator for cooperative schedulers
+# blocking handler work belongs in generator handlers yielding GUI.Background() tasks (see GUITask)
+class AsyncGUI(GUI):
+
+	# constructor, same arguments as GUI
+	def __init__(self, *args, **kwargs):
+		self.OnWake = None		# called (from any thread) when Step() should run as soon as possible
+		self.displayClosed = False
+		GUI.__init__(self, *args, **kwargs)
+
+	# (internal use) make the calling thread the GUI thread, no loop thread is started
+	def loopStart(self):
+		self.GuiThread = threading.current_thread()
+		self.IsRunning = True
+
+	# ask the application to call Step() soon (thread safe)
+	def Wake(self):
+		onWake = self.OnWake
+		if onWake != None:
+			onWake()
+
+	# (internal use) fetch pending events without waiting
+	def eventsGet(self):
+		pygame.event.pump()
+		return pygame.event.get()
+
+	# get seconds until Step() is due (input is polled TargetFPS times per second)
+	def NextTimeout(self):
+		return self.loopTimeout(self.frameInterval())
+
+	# run one GUI loop iteration without blocking (GUI thread), returns False once the GUI has shut down
+	def Step(self):
+		if self.IsRunning == True:
+			try:
+				self.frameRun(self.eventsGet())
+			except Exception as e:
+				# exception occured in GUI loop. print error and shut down.
+				print ("Exception: " + str(e))
+				print (traceback.format_exc())
+				print ("Shutting down GUI...")
+				self.IsRunning = False
+				self.recordingCrashDump()
+		if self.IsRunning == False and self.displayClosed == False:
+			self.displayClosed = True
+			self.Display.Close()
+			print ("GUI loop exiting...")
+		return self.IsRunning
+
+	# GUI loop as generator, steps once per iteration and yields the seconds to wait before the next one
+	def Loop(self):
+		while self.Step() == True:
+			yield self.NextTimeout()
+
+# Hit test index, a uniform grid of clickable elements for touch dispatch
+class GUIHitIndex:
+
+	# default grid cell size (pixels)
+	CELLSIZE = 64
+
+	# constructor
+	def __init__(self, cellSize = CELLSIZE):
+		self.CellSize = cellSize
+		self.cells = {}		# (column, row) -> sorted list of (zOrder, element)
+		self.entries = {}	# id(element) -> (zOrder, element, cell list)
+		self.zOrderNext = 0
+
+	# (internal use) get grid cells covered by an element
+	def cellsCovered(self, element):
+		columns = range(int(element.PosX // self.CellSize), int((element.PosX + max(element.SizeX, 1) - 1) // self.CellSize) + 1)
+		rows = range(int(element.PosY // self.CellSize), int((element.PosY + max(element.SizeY, 1) - 1) // self.CellSize) + 1)
+		return [(column, row) for column in columns for row in rows]
+
+	# add element on top of all elements added before (or reindex it, keeping its z order)
+	def Add(self, element):
+		entry = self.entries.get(id(element))
+		if entry != None:
+			zOrder = entry[0]
+			self.Remove(element)
+		else:
+			zOrder = self.zOrderNext
+			self.zOrderNext = self.zOrderNext + 1
+		cells = self.cellsCovered(element)
+		for cell in cells:
+			bisect.insort(self.cells.setdefault(cell, []), (zOrder, element))
+		self.entries[id(element)] = (zOrder, element, cells)
+
+	# remove element from index
+	def Remove(self, element):
+		entry = self.entries.pop(id(element), None)
+		if entry != None:
+			zOrder, element, cells = entry
+			for cell in cells:
+				cellEntries = self.cells[cell]
+				cellEntries.remove((zOrder, element))
+				if len(cellEntries) == 0:
+					del self.cells[cell]
+
+	# update element after it has been moved or resized
+	def Update(self, element):
+		if id(element) in self.entries:
+			self.Add(element)
+
+	# get topmost visible and enabled element at position, None if there is none
+	def HitTest(self, posX, posY):
+		cellEntries = self.cells.get((int(posX // self.CellSize), int(posY // self.CellSize)))
+		if cellEntries != None:
+			for zOrder, element in reversed(cellEntries):
+				if element.Visible == True and element.Enabled == True and element.HitTest(posX, posY):
+					return element
+		return None
+
+
+# GUI element parent base class, holds elements with their hit index and saved backgrounds (see GUIPage, GUIContainer)
+class GUIParent:
+
+	# constructor
+	def __init__(self):
+		self.Elements = []
+		self.elementsByName = {}	# element name -> element (first added)
+		self.HitIndex = GUIHitIndex()
+		# save pixels under visible elements, so hiding an element does not require redrawing everything
+		self.BackgroundBuffering = True
+		self.backgrounds = {}		# id(element) -> (rect, saved pixels)
+		self.renderingAll = False
+		self.repairing = False
+
+	# (internal use) number elements in drawing order, descending into containers
+	def elementsOrder(self, order):
+		for element in self.Elements:
+			order[id(element)] = len(order)
+			if isinstance(element, GUIContainer):
+				element.elementsOrder(order)
+
+	# add GUI Element
+        def AddElement(self, guiElement):
+                guiElement.RenderingSurfaceSet(self.canvasGet())
+		guiElement.Parent = self
+		guiElement.Page = self.PageGet()
+		# index elements that can be hit (clickable elements and containers)
+		if hasattr(guiElement, 'HitTest'):
+			self.HitIndex.Add(guiElement)
+                self.Elements.append(guiElement)
+		self.elementsByName.setdefault(guiElement.Name, guiElement)
+                return guiElement
+
+	# get GUI element by name (searching containers too)
+        def ElementByName(self, elementName):
+		element = self.elementsByName.get(elementName)
+		if element == None:
+			for container in self.Elements:
+				if isinstance(container, GUIContainer):
+					element = container.ElementByName(elementName)
+					if element != None:
+						break
+		return element
+
+	# (internal use) get the surface the elements are drawn on
+	def canvasGet(self):
+		return self.Surface
+
+	# (internal use) get bytes held by saved backgrounds and element caches
+	def elementsCacheBytes(self):
+		cacheBytes = sum([surfaceBytes(background) for rect, background in self.backgrounds.values()])
+		return cacheBytes + sum([element.CacheBytes() for element in self.Elements])
+
+	# (internal use) drop saved backgrounds and element caches
+	def elementsCacheDrop(self):
+		self.backgroundsDrop()
+		for element in self.Elements:
+			element.CacheDrop()
+
+	# (internal use) report a region of the canvas changed by the elements
+	def regionReport(self, rect):
+		pass
+
+	# (internal use) drop all saved backgrounds, giving them back to the surface pool
+	def backgroundsDrop(self):
+		backgrounds = self.backgrounds
+		self.backgrounds = {}
+		for rect, background in backgrounds.values():
+			SurfaceRelease(background)
+
+	# (internal use) called when an element has been moved or resized
+	def ElementMoved(self, guiElement):
+		self.HitIndex.Update(guiElement)
+		# saved background is for the old position, erase the element there before dropping it
+		entry = self.backgrounds.pop(id(guiElement), None)
+		if entry != None:
+			rect, background = entry
+			if self.renderingAll == False:
+				self.canvasGet().blit(background, rect)
+				# redraw overlapping elements above and report the old position
+				self.ElementRendered(guiElement, rect)
+			SurfaceRelease(background)
+
+	# (internal use) save the canvas pixels under a visible element (once, until it is hidden again)
+	def ElementBackgroundCapture(self, guiElement):
+		if self.BackgroundBuffering == True and id(guiElement) not in self.backgrounds:
+			canvas = self.canvasGet()
+			rect = pygame.Rect(guiElement.PosX, guiElement.PosY, guiElement.SizeX, guiElement.SizeY).clip(canvas.get_rect())
+			background = SurfaceCreate(rect.size, False)
+			background.blit(canvas, (0, 0), rect)
+			self.backgrounds[id(guiElement)] = (rect, background)
+
+	# (internal use) restore the canvas pixels under a hidden element, returns False if the element has to erase itself
+	def ElementBackgroundRestore(self, guiElement):
+		if self.BackgroundBuffering == False:
+			return False
+		if self.renderingAll == True:
+			# elements are drawn bottom to top, nothing to erase
+			return True
+		entry = self.backgrounds.pop(id(guiElement), None)
+		if entry == None:
+			# already erased (or never drawn), nothing to erase
+			return True
+		rect, background = entry
+		self.canvasGet().blit(background, rect)
+		SurfaceRelease(background)
+		return True
+
+	# (internal use) called when an element has (re)drawn rect: redraws visible elements above it
+	# that overlap (bottom to top, updating their saved backgrounds first), then reports the region
+	def ElementRendered(self, guiElement, rect):
+		if self.BackgroundBuffering == True and self.renderingAll == False and self.repairing == False and guiElement in self.Elements:
+			self.repairing = True
+			try:
+				canvas = self.canvasGet()
+				damage = [pygame.Rect(rect)]
+				for upper in self.Elements[self.Elements.index(guiElement) + 1:]:
+					if upper.Visible == True:
+						upperRect = pygame.Rect(upper.PosX, upper.PosY, upper.SizeX, upper.SizeY)
+						if upperRect.collidelist(damage) != -1:
+							entry = self.backgrounds.get(id(upper))
+							if entry != None:
+								savedRect, background = entry
+								for damageRect in damage:
+									area = savedRect.clip(damageRect)
+									if area.width > 0 and area.height > 0:
+										background.blit(canvas, (area.x - savedRect.x, area.y - savedRect.y), area)
+							upper.Render()
+							damage.append(upperRect)
+			finally:
+				self.repairing = False
+		self.regionReport(rect)
+
+	# get topmost visible and enabled clickable element at position (descending into containers)
+	def ElementAt(self, posX, posY):
+		element = self.HitIndex.HitTest(posX, posY)
+		if isinstance(element, GUIContainer):
+			element = element.ElementAt(posX - element.PosX, posY - element.PosY)
+		return element
+
+	# (internal use) render all elements bottom to top (skipping those outside clipRect), saving their backgrounds anew
+	def elementsRender(self, clipRect = None):
+		self.backgroundsDrop()
+		self.renderingAll = True
+		gui = self.GUIGet()
+		profiler = None
+		if gui != None:
+			profiler = gui.Profiler
+		try:
+			for element in self.Elements:
+				if clipRect != None and not clipRect.colliderect((element.PosX, element.PosY, element.SizeX, element.SizeY)):
+					continue
+				if profiler == None:
+					element.Render()
+				else:
+					profiler.ElementRender(element)
+		finally:
+			self.renderingAll = False
+
+
 # GUI Page base class (inherit from this to create your own GUI pages)
-class GUIPage:
+class GUIPage(GUIParent):
 
 	# constructor
         def __init__(self, pageName):
-                self.Elements = []
+		GUIParent.__init__(self)
                 self.Name = pageName
                 self.Surface = None
 		self.IsActive = False
-
-	# add GUI Element to Page
-        def AddElement(self, guiElement):
-                guiElement.RenderingSurfaceSet(self.Surface)
-                self.Elements.append(guiElement)
-                return guiElement
+		self.GUI = None
+		# keep rendered contents while hidden for instant Show (trades memory for page switch time)
+		self.RetainBackbuffer = True
+		self.Backbuffer = None
+		self.BackbufferValid = False
+		# Initialize is called when the page is loaded (on first Show unless GUI.LazyPageInit is False)
+		self.IsInitialized = False
+		# update batch nesting level and elements changed during the batch (id -> element)
+		self.updateLevel = 0
+		self.updateGUI = None		# GUI holding display updates for the batch
+		self.dirtyElements = collections.OrderedDict()
+		self.updateLock = threading.RLock()
 
 	# initialization is used to set up elements on the page
 	def Initialize(self):
 		# do nothing in base class
 		pass
 
+	# (internal use) get the GUI object the page is attached to (None if not attached)
+	def GUIGet(self):
+		return self.GUI
+
+	# (internal use) get the page elements are on
+	def PageGet(self):
+		return self
+
+	# (internal use) forward changed region to the GUI if the page is on display
+	def DirtyRectAdd(self, rect):
+		if self.IsActive == True and self.GUI != None:
+			self.GUI.DirtyRectAdd(rect)
+
+	# (internal use) report region changed by the elements
+	def regionReport(self, rect):
+		self.DirtyRectAdd(rect)
+
+	# start an update batch (may be nested): element changes only mark elements dirty until the matching EndUpdate
+	def BeginUpdate(self):
+		with self.updateLock:
+			self.updateLevel = self.updateLevel + 1
+			if self.updateLevel == 1:
+				# hold display updates for the batch
+				self.updateGUI = self.GUI
+				if self.updateGUI != None:
+					self.updateGUI.BeginUpdate()
+
+	# end an update batch, the outermost EndUpdate renders each dirty element once in z-order and presents once
+	# (rendering is posted to the GUI thread when the batch ends on another thread)
+	def EndUpdate(self):
+		with self.updateLock:
+			if self.updateLevel == 0:
+				return
+			self.updateLevel = self.updateLevel - 1
+			if self.updateLevel > 0:
+				return
+			elements = self.dirtyElements.values()
+			self.dirtyElements = collections.OrderedDict()
+			gui = self.updateGUI
+			self.updateGUI = None
+		if gui != None and threading.current_thread() is not gui.GuiThread:
+			gui.Post(functools.partial(self.batchFlush, gui, elements))
+		else:
+			self.batchFlush(gui, elements)
+
+	# (internal use) render the elements of an ended batch, then release the display updates held for it
+	def batchFlush(self, gui, elements):
+		try:
+			self.batchRender(elements)
+		finally:
+			if gui != None:
+				gui.EndUpdate()
+
+	# update batch as context manager: with page.Batch(): ...
+	@contextlib.contextmanager
+	def Batch(self):
+		self.BeginUpdate()
+		try:
+			yield self
+		finally:
+			self.EndUpdate()
+
+	# (internal use) mark an element for rendering at the end of the current update batch
+	def ElementDirty(self, guiElement):
+		with self.updateLock:
+			self.dirtyElements[id(guiElement)] = guiElement
+
+	# (internal use) render elements in z-order, skipping those drawn by a dirty container anyway
+	def batchRender(self, elements):
+		if len(elements) == 0:
+			return
+		dirty = set(id(element) for element in elements)
+		order = {}
+		self.elementsOrder(order)
+		gui = self.GUIGet()
+		profiler = None
+		if gui != None:
+			profiler = gui.Profiler
+		for element in sorted(elements, key = lambda element: order.get(id(element), -1)):
+			parent = element.Parent
+			while isinstance(parent, GUIContainer) and id(parent) not in dirty:
+				parent = parent.Parent
+			if isinstance(parent, GUIContainer):
+				continue
+			if profiler == None:
+				element.Render()
+			else:
+				profiler.ElementRender(element)
+
 	# called when page is being shown
 	def OnShow(self):
 		# do nothing in base class
 		pass
 
+	# discard retained backbuffer contents, the page is fully rendered when shown next
+	def InvalidateBackbuffer(self):
+		self.BackbufferValid = False
+
+	# get bytes held by the backbuffer, saved backgrounds and element caches
+	def MemoryUsage(self):
+		memoryUsage = self.elementsCacheBytes()
+		if self.Backbuffer != None:
+			memoryUsage = memoryUsage + surfaceBytes(self.Backbuffer)
+		return memoryUsage
+
+	# drop backbuffer, saved backgrounds and element caches (elements are kept, the page is fully rendered when shown next)
+	def Unload(self):
+		if self.Backbuffer != None:
+			if self.Surface is self.Backbuffer and self.GUI != None:
+				# hidden page, render to scratch surface from now on
+				self.RenderingSurfaceSet(self.GUI.scratchSurfaceGet())
+			SurfaceRelease(self.Backbuffer)
+			self.Backbuffer = None
+		self.BackbufferValid = False
+		self.elementsCacheDrop()
+
 	# render all elements on the page
         def Render(self):
-		for element in self.Elements:
-			try:
-				element.Render()
-			except:
-				raise
+		# clear first, hidden elements draw nothing during a full render (their saved backgrounds are dropped)
+		self.Surface.fill((0,0,0))
+		self.DirtyRectAdd(self.Surface.get_rect())
+		self.elementsRender()
 			
 	# (internal use) set rendering surface
         def RenderingSurfaceSet(self, renderingSurface):
@@ -479,14 +2010,128 @@ class GUIPage:
 		for element in self.Elements:
 			element.RenderingSurfaceSet(self.Surface)
 
-	# get page GUI element by name
-        def ElementByName(self, elementName):
-                for element in self.Elements:
-                        if element.Name == elementName:
-                                return element
 
+# Container element, holds child elements in local coordinates (derives from GUIElement and GUIParent)
+# children are drawn to the container's own buffer, which is copied to the page when changed
+class GUIContainer(GUIElement, GUIParent):
 
+	# container default background color
+	COLOR_BKGRND = ((0, 0, 0))
 
+	# attributes that require the children to be redrawn
+	BUFFER_ATTRIBUTES = frozenset(('SizeX', 'SizeY', 'ColorBackground', 'ClipRect'))
+
+	# constructor
+	def __init__(self, elementName, posX, posY, sizeX, sizeY):
+		self.buffer = None
+		self.bufferValid = False
+		GUIParent.__init__(self)
+		GUIElement.__init__(self, elementName, posX, posY, sizeX, sizeY)
+		self.Enabled = True
+		self.ColorBackground = self.COLOR_BKGRND
+		self.ClipRect = None		# children are drawn and hit only within this rect (local coordinates, None: whole container)
+
+	# attribute assignment hook, passes the page on to the children and invalidates the buffer
+	def __setattr__(self, name, value):
+		if name == 'Page':
+			for element in self.__dict__.get('Elements', ()):
+				element.Page = value
+		elif name in self.BUFFER_ATTRIBUTES:
+			self.__dict__['bufferValid'] = False
+			if name in ('SizeX', 'SizeY') and self.__dict__.get('buffer') != None:
+				self.__dict__['buffer'] = None
+		GUIElement.__setattr__(self, name, value)
+
+	# (internal use) get the buffer the children are drawn on
+	def canvasGet(self):
+		if self.buffer == None:
+			self.buffer = SurfaceCreate((max(self.SizeX, 1), max(self.SizeY, 1)))
+			self.bufferValid = False
+			for element in self.Elements:
+				element.RenderingSurfaceSet(self.buffer)
+		return self.buffer
+
+	# (internal use) get the page elements are on
+	def PageGet(self):
+		return self.Page
+
+	# (internal use) get the clip rect in local coordinates
+	def clipRectGet(self):
+		rect = pygame.Rect(0, 0, self.SizeX, self.SizeY)
+		if self.ClipRect != None:
+			rect = rect.clip(self.ClipRect)
+		return rect
+
+	# discard buffered contents, the children are redrawn when the container is rendered next
+	def InvalidateBuffer(self):
+		self.bufferValid = False
+
+	# get bytes held by the buffer, saved backgrounds and caches of the children
+	def CacheBytes(self):
+		cacheBytes = self.elementsCacheBytes()
+		if self.buffer != None:
+			cacheBytes = cacheBytes + surfaceBytes(self.buffer)
+		return cacheBytes
+
+	# drop saved backgrounds and caches of the children (the buffer is kept, children draw on it)
+	def CacheDrop(self):
+		self.elementsCacheDrop()
+		self.bufferValid = False
+
+	# add child element (position is relative to the container)
+	def AddElement(self, guiElement):
+		self.bufferValid = False
+		return GUIParent.AddElement(self, guiElement)
+
+	# (internal use) called when a child has been moved or resized
+	def ElementMoved(self, guiElement):
+		GUIParent.ElementMoved(self, guiElement)
+		# old position needs to be erased
+		self.bufferValid = False
+
+	# (internal use) copy region changed by the children to the rendering surface and report it
+	def regionReport(self, rect):
+		if self.renderingAll == True or self.Visible == False or self.Surface == None:
+			return
+		if self.bufferValid == False:
+			# children were added or moved, redraw all of them
+			self.Render()
+			return
+		rect = pygame.Rect(rect).clip(self.clipRectGet())
+		if rect.width > 0 and rect.height > 0:
+			self.Surface.blit(self.buffer, (self.PosX + rect.x, self.PosY + rect.y), rect)
+			GUIElement.DirtyRectAdd(self, rect.move(self.PosX, self.PosY))
+
+	# hit test, returns True if the display position lies on an enabled child (position in parent coordinates)
+	def HitTest(self, posX, posY):
+		return self.ElementAt(posX - self.PosX, posY - self.PosY) != None
+
+	# get topmost visible and enabled clickable child at local position
+	def ElementAt(self, posX, posY):
+		if not self.clipRectGet().collidepoint(posX, posY):
+			return None
+		return GUIParent.ElementAt(self, posX, posY)
+
+	# render method draws the container (redrawing the children only if the buffer is not valid)
+	def Render(self):
+		if self.Visible == True:
+			canvas = self.canvasGet()
+			if self.bufferValid == False:
+				clipRect = self.clipRectGet()
+				canvas.set_clip(clipRect)
+				canvas.fill(self.ColorBackground)
+				self.elementsRender(clipRect)
+				self.bufferValid = True
+			self.BackgroundCapture()
+			clipRect = self.clipRectGet()
+			self.Surface.blit(canvas, (self.PosX + clipRect.x, self.PosY + clipRect.y), clipRect)
+		else:
+			# restore background if invisible (draw background color rectangle without background buffering)
+			if self.BackgroundRestore() == False:
+				pygame.draw.rect(self.Surface, self.ColorBackground, (self.PosX, self.PosY, self.SizeX, self.SizeY))
+
+		# report the touched region
+		return self.DirtyRectAdd(pygame.Rect(self.PosX, self.PosY, self.SizeX, self.SizeY))
 
 
 # Numpad Page, can be used to acquire numeric values
@@ -506,38 +2151,27 @@ class NumPadPage(GUIPage):
 
 	# update display according to user input
 	def updateUserInput(self):
-		# draw filler chars (zeros)
-                self.lblUserInput.Text = str('0')*(self.MaxLen-len(self.userInput)) + str(self.userInput)
-                self.lblUserInput.Render()
-		# do we have user input?
-		if self.userInput != '':
-			self.btnNum0.Enabled = True
-			self.btnNum0.Render()
-			self.btnClear.Enabled = True
-			self.btnClear.Render()
-			self.btnBackspace.Enabled = True
-			self.btnBackspace.Render()
-			if (int(self.userInput) > self.LimitHigh) or (int(self.userInput) < self.LimitLow) :
+		# batch the changes, changed elements are rendered once at the end
+		with self.Batch():
+			# draw filler chars (zeros)
+			self.lblUserInput.Text = str('0')*(self.MaxLen-len(self.userInput)) + str(self.userInput)
+			# do we have user input?
+			if self.userInput != '':
+				self.btnNum0.Enabled = True
+				self.btnClear.Enabled = True
+				self.btnBackspace.Enabled = True
+				if (int(self.userInput) > self.LimitHigh) or (int(self.userInput) < self.LimitLow) :
+					self.btnEnter.Enabled = False
+					self.lblLimit.Visible = True
+				else:
+					self.btnEnter.Enabled = True
+					self.lblLimit.Visible = False
+			else:
+				self.btnBackspace.Enabled = False
+				self.btnClear.Enabled = False
+				self.btnNum0.Enabled = False
 				self.btnEnter.Enabled = False
-				self.btnEnter.Render()
 				self.lblLimit.Visible = True
-				self.lblLimit.Render()
-			else:
-				self.btnEnter.Enabled = True
-				self.btnEnter.Render()
-				self.lblLimit.Visible = False
-				self.lblLimit.Render()	
-		else:
-			self.btnBackspace.Enabled = False
-			self.btnBackspace.Render()
-			self.btnClear.Enabled = False
-			self.btnClear.Render()
-			self.btnNum0.Enabled = False
-			self.btnNum0.Render()
-			self.btnEnter.Enabled = False
-			self.btnEnter.Render()
-			self.lblLimit.Visible = True
-			self.lblLimit.Render()
 
 	# helper function to append user input
         def UserInputAppend(self, value):
@@ -559,7 +2193,7 @@ class NumPadPage(GUIPage):
 	# OK button pressed
 	def btnEnter_Click(self):
 		if self.OnAccept != None:
-			self.OnAccept(int(self.userInput))
+			self.btnEnter.handlerInvoke(self.OnAccept, int(self.userInput))
 			self.userInput = ''
 			self.updateUserInput()
 
@@ -579,7 +2213,7 @@ class NumPadPage(GUIPage):
 		self.userInput = ''
 		self.updateUserInput()
 		if self.OnCancel != None:
-			self.OnCancel()
+			self.btnCancel.handlerInvoke(self.OnCancel)
 
 	# page initialization
 	def Initialize(self):
@@ -595,6 +2229,7 @@ class NumPadPage(GUIPage):
 		self.lblUserInput.TextAlignHorizontal = GUITextBox.TEXTALIGN_HORIZONTAL_RIGHT
 		self.lblUserInput.FontSize = 60
 		self.lblUserInput.BorderVisible = False
+		self.lblUserInput.GlyphAtlas = True
 		# Limit warning label
 		self.lblLimit = self.AddElement(GUITextBox('lblLimit', 25, 64, 187, 40, 'RANGE: ' + str(self.LimitLow) + '...' + str(self.LimitHigh), None))
 		self.lblLimit.TextAlignHorizontal = GUITextBox.TEXTALIGN_HORIZONTAL_LEFT
@@ -644,6 +2279,12 @@ class NumPadPage(GUIPage):
 		self.btnEnter.ColorBodyInactive = ((0, 255, 0))
 		self.btnEnter.Enabled = False
 
+	# update title if it was changed while hidden (page may be restored from its backbuffer)
+	def OnShow(self):
+		if self.lblText.Text != self.Text:
+			self.lblText.Text = self.Text
+			self.lblText.Render()
+
 	# override render method to ensure the numpad text is correctly displayed
 	def Render(self):
 		# update textbox